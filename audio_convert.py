@@ -0,0 +1,267 @@
+"""Probe-driven audio conversion planning.
+
+Each source is probed with ffprobe first, so a file is stream-copied when
+the target container can hold its codec, skipped when an up-to-date
+output already exists, and only re-encoded otherwise.
+
+A preset names several profiles; all of its outputs come from one ffmpeg
+run, which decodes the source once and feeds every encoder (through one
+loudnorm filter and an asplit when normalizing). ffmpeg writes each
+output under its partial_path; it gets its real name only once it has
+been probed whole, so an interrupted run never looks up to date. The
+source may be deleted after that.
+"""
+
+import json
+import os
+import subprocess
+import threading
+
+from bbdown_core import POPEN_FLAGS
+
+PROBE_TIMEOUT = 30
+
+# target profiles: output extension, the codec it holds, how to encode into it,
+# the sample rate to resample to after loudnorm, and which tags the container keeps
+_MP3 = {"ext": ".mp3", "codec": "mp3", "rate": 44100, "tags": True, "cover": True}
+_OPUS = {"ext": ".opus", "codec": "opus", "rate": 48000, "tags": True, "cover": False}
+_AAC = {"ext": ".aac", "codec": "aac", "rate": 48000, "tags": False, "cover": False}
+CONVERT_PROFILES = {
+    "mp3-v0": {**_MP3, "encode": ["-c:a", "libmp3lame", "-q:a", "0"]},
+    "mp3-v2": {**_MP3, "encode": ["-c:a", "libmp3lame", "-q:a", "2"]},
+    "mp3-320k": {**_MP3, "encode": ["-c:a", "libmp3lame", "-b:a", "320k"]},
+    "mp3-192k": {**_MP3, "encode": ["-c:a", "libmp3lame", "-b:a", "192k"]},
+    "opus-128k": {**_OPUS, "encode": ["-c:a", "libopus", "-b:a", "128k"]},
+    "opus-96k": {**_OPUS, "encode": ["-c:a", "libopus", "-b:a", "96k"]},
+    "aac-192k": {**_AAC, "encode": ["-c:a", "aac", "-b:a", "192k"]},
+}
+# presets: several profiles from one decode
+CONVERT_PRESETS = {
+    "mp3-v0 + opus-128k": ["mp3-v0", "opus-128k"],
+    "mp3-v0 + aac-192k": ["mp3-v0", "aac-192k"],
+    "mp3-320k + opus-128k": ["mp3-320k", "opus-128k"],
+}
+DEFAULT_CONVERT_PROFILE = "mp3-v0"
+
+# EBU R128 single-pass normalization
+LOUDNORM_FILTER = "loudnorm=I=-16:TP=-1.5:LRA=11"
+
+# an output passes validation when its length is within this of the source's
+DURATION_TOLERANCE = 1.0
+DURATION_TOLERANCE_RATIO = 0.01
+
+# sidecar images used as cover when the source has none embedded
+COVER_EXTS = (".jpg", ".jpeg", ".png")
+
+# encode speed (audio seconds per second) assumed until one has been measured
+DEFAULT_ENCODE_SPEED = 40.0
+
+
+def probe(ffprobe_path: str, path: str) -> dict:
+    """Codec and duration of the first audio stream, title tag, embedded cover; empty on failure."""
+    try:
+        result = subprocess.run(
+            [
+                ffprobe_path, "-v", "error",
+                "-show_entries", "stream=codec_type,codec_name,bit_rate:format=duration:format_tags=title",
+                "-of", "json", path,
+            ],
+            capture_output=True,
+            timeout=PROBE_TIMEOUT,
+            creationflags=POPEN_FLAGS,
+        )
+        data = json.loads(result.stdout or b"{}")
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return {}
+
+    streams = data.get("streams") or []
+    audio = next((st for st in streams if st.get("codec_type", "audio") == "audio"), {})
+    fmt = data.get("format") or {}
+    return {
+        "codec": audio.get("codec_name", ""),
+        "bit_rate": int(audio.get("bit_rate") or 0),
+        "duration": float(fmt.get("duration") or 0),
+        "title": (fmt.get("tags") or {}).get("title", ""),
+        # m4a cover art shows up as a still-image video stream
+        "cover": any(st.get("codec_type") == "video" for st in streams),
+    }
+
+
+class ConversionPlan:
+    """What to do with one source: "skip", "copy" or "encode".
+
+    ``outputs`` holds (profile, path, action) per target; ``action`` is the
+    costliest of them, and ``cmd`` produces every output not skipped, at
+    its partial_path.
+    """
+
+    def __init__(self, source: str, outputs: list[tuple[str, str, str]], cmd: list[str], duration: float):
+        self.source = source
+        self.outputs = outputs
+        self.cmd = cmd
+        self.duration = duration
+
+    @property
+    def action(self) -> str:
+        actions = {action for _, _, action in self.outputs}
+        return next((a for a in ("encode", "copy") if a in actions), "skip")
+
+    @property
+    def written(self) -> list[tuple[str, str]]:
+        """(profile, path) of the outputs ``cmd`` writes."""
+        return [(profile, path) for profile, path, action in self.outputs if action != "skip"]
+
+    @property
+    def output(self) -> str:
+        return ", ".join(path for _, path, _ in self.outputs)
+
+
+def output_path(source: str, profile: str) -> str:
+    return os.path.splitext(source)[0] + CONVERT_PROFILES[profile]["ext"]
+
+
+def partial_path(output: str) -> str:
+    """Where ffmpeg writes ``output`` until it is validated ("x.mp3" → "x.part.mp3")."""
+    stem, ext = os.path.splitext(output)
+    # the extension stays last: ffmpeg picks the muxer from it
+    return stem + ".part" + ext
+
+
+def is_up_to_date(source: str, output: str) -> bool:
+    try:
+        src = os.stat(source)
+        out = os.stat(output)
+    except OSError:
+        return False
+    return out.st_size > 0 and out.st_mtime >= src.st_mtime
+
+
+def profiles_of(name: str) -> list[str]:
+    """The profiles a preset (or a single profile) ``name`` produces."""
+    return CONVERT_PRESETS.get(name) or [name]
+
+
+def sidecar_cover(source: str) -> str | None:
+    stem = os.path.splitext(source)[0]
+    return next((stem + ext for ext in COVER_EXTS if os.path.isfile(stem + ext)), None)
+
+
+def plan_conversion(ffmpeg_path: str, ffprobe_path: str, source: str,
+                    profile: str = DEFAULT_CONVERT_PROFILE, allow_copy: bool = True,
+                    threads: int = 0, loudnorm: bool = False, tags: bool = True) -> ConversionPlan:
+    """Probe ``source`` and decide how to produce the outputs of ``profile``.
+
+    ``profile`` may name a preset. ``threads`` caps ffmpeg's threads for
+    this run; 0 leaves ffmpeg's default. ``loudnorm`` normalizes every
+    encoded output (copies stay as they are). ``tags`` carries the title
+    and other metadata, and the cover where the container can hold one.
+    """
+    info = probe(ffprobe_path, source)
+    duration = info.get("duration", 0.0)
+
+    outputs = []
+    for name in profiles_of(profile):
+        output = output_path(source, name)
+        if is_up_to_date(source, output):
+            action = "skip"
+        elif allow_copy and not loudnorm and info.get("codec") == CONVERT_PROFILES[name]["codec"]:
+            action = "copy"
+        else:
+            action = "encode"
+        outputs.append((name, output, action))
+
+    plan = ConversionPlan(source, outputs, [], duration)
+    if plan.action == "skip":
+        return plan
+
+    thread_args = ["-threads", str(threads)] if threads else []
+    cmd = [ffmpeg_path, "-nostdin", "-y", *thread_args, "-i", source]
+
+    cover = None
+    if tags and any(CONVERT_PROFILES[name]["cover"] for name, _ in plan.written):
+        if info.get("cover"):
+            cover = "0:v:0"
+        elif sidecar_cover(source):
+            cmd += ["-i", sidecar_cover(source)]
+            cover = "1:v:0"
+
+    # one loudnorm for all encoded outputs, split after the filter
+    encoded = [path for _, path, action in outputs if action == "encode"]
+    labels = {}
+    if loudnorm and encoded:
+        labels = {path: f"[n{i}]" for i, path in enumerate(encoded)}
+        if len(encoded) > 1:
+            tail = f",asplit={len(encoded)}{''.join(labels.values())}"
+        else:
+            tail = labels[encoded[0]]
+        cmd += ["-filter_complex", f"[0:a:0]{LOUDNORM_FILTER}{tail}"]
+
+    for name, output, action in outputs:
+        if action == "skip":
+            continue
+        target = CONVERT_PROFILES[name]
+        if output in labels:
+            args = ["-map", labels[output], *target["encode"], "-ar", str(target["rate"])]
+        elif action == "copy":
+            args = ["-map", "0:a:0", "-c:a", "copy"]
+        else:
+            args = ["-map", "0:a:0", *target["encode"]]
+
+        if cover and target["cover"]:
+            args += ["-map", cover, "-c:v", "copy", "-disposition:v:0", "attached_pic"]
+        else:
+            args += ["-vn"]
+
+        if tags and target["tags"]:
+            args += ["-map_metadata", "0"]
+            if not info.get("title"):
+                args += ["-metadata", f"title={os.path.splitext(os.path.basename(source))[0]}"]
+            if target["codec"] == "mp3":
+                args += ["-id3v2_version", "3"]
+        else:
+            args += ["-map_metadata", "-1"]
+        cmd += [*args, *thread_args, partial_path(output)]
+
+    plan.cmd = cmd
+    return plan
+
+
+def validate_output(ffprobe_path: str, path: str, profile: str, duration: float) -> str | None:
+    """Why ``path`` is not a usable ``profile`` output of a ``duration`` s source; None if it is."""
+    info = probe(ffprobe_path, path)
+    if not info:
+        return "unreadable"
+    codec = CONVERT_PROFILES[profile]["codec"]
+    if info["codec"] != codec:
+        return f"codec {info['codec'] or 'none'}, expected {codec}"
+    tolerance = max(DURATION_TOLERANCE, duration * DURATION_TOLERANCE_RATIO)
+    if duration and abs(info["duration"] - duration) > tolerance:
+        return f"{info['duration']:.1f}s long, source {duration:.1f}s"
+    return None
+
+
+class EncodeSpeed:
+    """Running estimate of re-encode speed, used to report time saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._audio = 0.0
+        self._wall = 0.0
+
+    def add(self, duration: float, elapsed: float):
+        if duration <= 0 or elapsed <= 0:
+            return
+        with self._lock:
+            self._audio += duration
+            self._wall += elapsed
+
+    @property
+    def speed(self) -> float:
+        with self._lock:
+            return self._audio / self._wall if self._wall else DEFAULT_ENCODE_SPEED
+
+    def saved(self, plan: ConversionPlan, elapsed: float) -> float:
+        """Seconds saved against re-encoding ``plan``'s source."""
+        if plan.action == "encode" or not plan.duration:
+            return 0.0
+        return max(plan.duration / self.speed - elapsed, 0.0)
@@ -0,0 +1,1333 @@
+"""Settings, command building, progress parsing and job scheduling.
+
+Shared by ``main-gui.py`` and the headless ``main-cli.py``; nothing here
+may import tkinter, so batch runs start without a display.
+"""
+
+import hashlib
+import io
+import os
+import sys
+import subprocess
+import re
+import json
+import random
+import shutil
+import threading
+import time
+import zipfile
+from collections import deque
+
+from collection_sync import BiliClient, CollectionSync
+from download_index import (
+    MEDIA_EXTS, DownloadIndex, find_outputs, format_page_ranges, parse_page_spec, video_id_from_url,
+)
+from host_select import DEFAULT_UPOS_HOSTS, HostSelector, host_arg
+from job_metrics import JobMetrics, MetricsWriter
+from process_control import governed_command, kill_tree, popen_options, resume_tree, suspend_tree
+from staging import JOB_DIR_PREFIX, KEPT_DIR_PREFIX, SpaceGovernor, move_file
+
+# job queue
+DEFAULT_MAX_JOBS = 2
+JOB_LOG_LINES = 2000
+
+# job rows are refreshed at most this often while progress streams in
+PROGRESS_UI_INTERVAL = 0.2
+
+# seconds between admission checks while jobs wait for disk space
+ADMIT_RECHECK = 5.0
+
+POPEN_FLAGS = subprocess.CREATE_NO_WINDOW if sys.platform.startswith("win") else 0
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+# state and caches, kept next to the config file in use (see data_path)
+INDEX_FILE = "downloads.db"
+WATCH_STATE_FILE = "watch_state.json"
+METRICS_FILE = "metrics.jsonl"
+HOST_CACHE_FILE = "host_cache.json"
+SYNC_STATE_FILE = "sync_state.json"
+
+# the onefile build ships utils/ as this one archive (see main-gui-onefile.spec)
+UTILS_ARCHIVE = "utils.zip"
+UTILS_CACHE_DIR = os.path.join(
+    os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "BBDown-GUI",
+)
+
+# every key config.json may hold, with its default
+DEFAULT_SETTINGS = {
+    "download_mode": "video",
+    "page_type": 0,
+    "page_value": "",
+    "delay_enabled": False,
+    "delay_seconds": "2",
+    "force_http": True,
+    "download_danmaku": False,
+    "video_ascending": False,
+    "audio_ascending": False,
+    "allow_pcdn": False,
+    "encoding_priority": "",
+    "dfn_priority": "",
+    "max_jobs": DEFAULT_MAX_JOBS,
+    # empty means the bundled binary under utils/
+    "bbdown_path": "",
+    "ffmpeg_path": "",
+    "aria2c_path": "",
+    "ffprobe_path": "",
+    # aria2c tuning: a named profile, plus per-option overrides (config only)
+    "aria2c_profile": "default",
+    "aria2c_options": {},
+    # total download rate shared by all running jobs, e.g. "8M"; each job
+    # gets limit / max_jobs, so the total holds however many run; empty = unlimited
+    "bandwidth_limit": "",
+    # consult the download index and only fetch pages not downloaded yet
+    "skip_downloaded": True,
+    "index_path": "",
+    # seconds a "Fetch Info" result stays valid
+    "info_cache_ttl": 3600,
+    # drag-and-drop conversion target: a profile or a multi-output preset
+    # (see audio_convert.CONVERT_PROFILES / CONVERT_PRESETS), optionally
+    # loudness-normalized; convert_tags carries title, tags and cover over
+    "convert_profile": "mp3-v0",
+    "convert_allow_copy": True,
+    "convert_loudnorm": False,
+    "convert_tags": True,
+    # convert new .m4a files in watch_dir (empty = BBDown's output dir) as they land
+    "watch_enabled": False,
+    "watch_dir": "",
+    "watch_settle_seconds": 3.0,
+    # append each GUI startup's timing report to this file as a JSON line
+    "startup_report_file": "",
+    # scheduling priority of BBDown (and its aria2c / ffmpeg) and of
+    # conversions: "normal", "low" or "idle" (see process_control)
+    "download_priority": "normal",
+    "convert_priority": "low",
+    # ffmpeg threads shared by all running conversions; 0 = one per CPU core
+    "ffmpeg_threads": 0,
+    # failed pages are fetched again through a narrowed --select-page,
+    # waiting retry_backoff seconds, doubled per attempt up to retry_backoff_max
+    "retry_attempts": 3,
+    "retry_backoff": 5.0,
+    "retry_backoff_max": 120.0,
+    # per-job timing records (JSON lines; empty path = metrics.jsonl next to
+    # config.json) and an optional Prometheus textfile with session totals
+    "metrics_enabled": True,
+    "metrics_file": "",
+    "metrics_prom_file": "",
+    # probe the candidate CDN hosts (empty = host_select.DEFAULT_UPOS_HOSTS,
+    # "http://127.0.0.1:8080" style entries allowed) and hand the fastest to
+    # BBDown as --upos-host; the ranking is reprobed after upos_probe_ttl.
+    # upos_probe_path should name a real object on the hosts: the default
+    # "/" gets an error page, so hosts are then ranked on latency only
+    "upos_select": False,
+    "upos_hosts": [],
+    "upos_probe_ttl": 3600,
+    "upos_probe_path": "/",
+    "upos_probe_bytes": 262144,
+    "upos_probe_timeout": 3.0,
+    # BBDown's --work-dir is a per-job folder, under scratch_dir (e.g. a
+    # local SSD) or, when empty, inside the output folder; finished files
+    # are then moved to the output folder
+    "scratch_dir": "",
+    # hold queued jobs while the disks they write to lack room for their
+    # estimated size (from BBDown's stream info) plus space_reserve; a job
+    # is only estimated once free space is within space_margin of the reserve
+    "space_check": True,
+    "space_reserve": "1G",
+    "space_margin": "8G",
+    # space / favorites / series URLs are expanded into their videos newer
+    # than the last sync; sync_cookie (e.g. "SESSDATA=...") reaches private
+    # favorites, sync_initial_limit caps a collection's first sync (0 = all)
+    "sync_cookie": "",
+    "sync_initial_limit": 0,
+}
+
+# aria2c options passed through BBDown's --aria2c-args; "default" keeps BBDown's own
+ARIA2C_PROFILES = {
+    "default": {},
+    "balanced": {
+        "max-connection-per-server": 8,
+        "split": 8,
+        "min-split-size": "5M",
+        "disk-cache": "32M",
+        "file-allocation": "none",
+    },
+    "fast": {
+        "max-connection-per-server": 16,
+        "split": 16,
+        "min-split-size": "1M",
+        "disk-cache": "64M",
+        "file-allocation": "none",
+    },
+    "gentle": {
+        "max-connection-per-server": 2,
+        "split": 2,
+        "min-split-size": "20M",
+        "disk-cache": "16M",
+        "file-allocation": "prealloc",
+    },
+}
+
+RATE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+# added on retries so aria2c picks up the segments left in BBDown's temp folder
+RESUME_ARIA2C_ARGS = ["--continue=true"]
+
+
+# ============================================================
+# Helpers
+# ============================================================
+
+def resource_path(relative_path: str) -> str:
+    if getattr(sys, "frozen", False):
+        base_path = sys._MEIPASS  # type: ignore[attr-defined]
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, relative_path)
+
+
+_utils_lock = threading.Lock()
+_utils_dir = None
+
+
+def bundled_utils_dir() -> str:
+    """Directory holding the bundled BBDown / ffmpeg / aria2c.
+
+    From source and in the onedir build that is ``utils/`` next to the
+    program. The onefile build carries a single utils.zip instead, which
+    is extracted once per archive version to a per-user cache dir and
+    reused by later launches.
+    """
+    global _utils_dir
+    with _utils_lock:
+        if _utils_dir is None:
+            archive = resource_path(UTILS_ARCHIVE)
+            _utils_dir = _extract_utils(archive) if os.path.isfile(archive) else resource_path("utils")
+        return _utils_dir
+
+
+def _extract_utils(archive: str) -> str:
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            # the central directory identifies the archive without reading it all
+            digest = hashlib.sha1()
+            for info in zf.infolist():
+                digest.update(f"{info.filename}:{info.CRC}:{info.file_size};".encode("utf-8"))
+            target = os.path.join(UTILS_CACHE_DIR, f"utils-{digest.hexdigest()[:12]}")
+            if os.path.exists(os.path.join(target, ".complete")):
+                return target
+
+            tmp = f"{target}.tmp-{os.getpid()}"
+            shutil.rmtree(tmp, ignore_errors=True)
+            zf.extractall(tmp)
+        with open(os.path.join(tmp, ".complete"), "w", encoding="utf-8"):
+            pass
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            # another instance finished first
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.exists(os.path.join(target, ".complete")):
+                raise
+        return target
+    except (OSError, zipfile.BadZipFile) as e:
+        print("Failed to extract bundled tools:", e)
+        return resource_path("utils")
+
+
+def open_output(stream, encoding=None):
+    # keep "\r" so progress redraws can be collapsed by the log view
+    return io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+
+
+def expand_audio_paths(paths, ext: str = ".m4a") -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, names in os.walk(path):
+                dirnames.sort()
+                files += [os.path.join(dirpath, n) for n in sorted(names) if n.lower().endswith(ext)]
+        else:
+            files.append(path)
+    return files
+
+
+def format_size(n: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024 or unit == "GiB":
+            return f"{n:.1f}{unit}" if unit != "B" else f"{n:.0f}B"
+        n /= 1024
+    return f"{n:.1f}GiB"
+
+
+def format_eta(seconds: float | None) -> str:
+    if seconds is None:
+        return ""
+    seconds = int(seconds)
+    h, rest = divmod(seconds, 3600)
+    m, sec = divmod(rest, 60)
+    return f"{h}:{m:02d}:{sec:02d}" if h else f"{m}:{sec:02d}"
+
+
+# ============================================================
+# Settings
+# ============================================================
+
+class CommandError(ValueError):
+    """The settings can't be turned into a BBDown command."""
+
+
+class JobDeferred(Exception):
+    """Raised by a run_job to hand its job back to the queue, e.g. to wait for disk space."""
+
+
+class AlreadyDownloaded(Exception):
+    """Every requested page is already in the download index."""
+
+
+def data_path(name: str, config_path: str = CONFIG_PATH) -> str:
+    """Where state file ``name`` lives for ``config_path``: in the same folder."""
+    return os.path.join(os.path.dirname(os.path.abspath(config_path)), name)
+
+
+def load_settings(path: str = CONFIG_PATH) -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    if not os.path.exists(path):
+        return settings
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            settings.update(json.load(f))
+    except Exception as e:
+        print("Failed to load config:", e, file=sys.stderr)
+    return settings
+
+
+def save_settings(data: dict, path: str = CONFIG_PATH):
+    # merge, so keys only set by hand (e.g. tool paths) survive a GUI save
+    settings = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                settings = json.load(f)
+        except Exception:
+            pass
+    settings.update(data)
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(settings, f, ensure_ascii=False, indent=2)
+
+
+TOOL_FILES = {
+    "bbdown": "BBDown/BBDown.exe",
+    "ffmpeg": "ffmpeg/bin/ffmpeg.exe",
+    "aria2c": "aria2/aria2c.exe",
+    "ffprobe": "ffmpeg/bin/ffprobe.exe",
+}
+
+
+def tool_paths(settings: dict) -> dict:
+    """Configured binary paths, falling back to the bundled ones.
+
+    May extract the bundled tools on first use, so the GUI calls this off
+    the UI thread.
+    """
+    tools = {name: settings.get(f"{name}_path") or "" for name in TOOL_FILES}
+    if not all(tools.values()):
+        utils = bundled_utils_dir()
+        for name, rel in TOOL_FILES.items():
+            tools[name] = tools[name] or os.path.join(utils, *rel.split("/"))
+    return tools
+
+
+def _parse_bytes(text: str) -> int | None:
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([KMG]?)", text)
+    return int(float(m.group(1)) * RATE_UNITS[m.group(2)]) if m else None
+
+
+def parse_rate(value) -> int:
+    """"8M" / "500K" / 1048576 → bytes per second; empty or 0 → 0 (unlimited)."""
+    text = str(value or "").strip().upper().removesuffix("/S").removesuffix("B")
+    if not text:
+        return 0
+    rate = _parse_bytes(text)
+    if rate is None:
+        raise CommandError(f"Bandwidth limit invalid: {value}. Example: 8M, 500K")
+    return rate
+
+
+def parse_size(value, name: str) -> int:
+    """"1G" / "1GiB" / "500M" / 1073741824 → bytes; empty → 0. ``name`` is the setting, for the error."""
+    text = str(value or "").strip().upper().removesuffix("B").removesuffix("I")
+    if not text:
+        return 0
+    size = _parse_bytes(text)
+    if size is None:
+        raise CommandError(f"{name} invalid: {value}. Example: 1G, 500M")
+    return size
+
+
+def aria2c_options(settings: dict) -> dict:
+    name = settings.get("aria2c_profile") or "default"
+    if name not in ARIA2C_PROFILES:
+        raise CommandError(f"Unknown aria2c profile: {name}")
+    options = dict(ARIA2C_PROFILES[name])
+    options.update(settings.get("aria2c_options") or {})
+    return options
+
+
+def with_aria2c_args(cmd: list[str], args: list[str]) -> list[str]:
+    """Return ``cmd`` with ``args`` merged into its --aria2c-args value."""
+    if not args:
+        return cmd
+    cmd = list(cmd)
+    if "--aria2c-args" in cmd:
+        i = cmd.index("--aria2c-args") + 1
+        cmd[i] = " ".join([cmd[i], *args])
+    else:
+        # keep the URL last
+        cmd[-1:-1] = ["--aria2c-args", " ".join(args)]
+    return cmd
+
+
+def with_upos_host(cmd: list[str], host: str | None) -> list[str]:
+    """Return ``cmd`` fetching from CDN ``host`` (None: BBDown's default)."""
+    cmd = list(cmd)
+    if "--upos-host" in cmd:
+        i = cmd.index("--upos-host")
+        del cmd[i:i + 2]
+    if host:
+        # keep the URL last
+        cmd[-1:-1] = ["--upos-host", host_arg(host)]
+    return cmd
+
+
+def bandwidth_share(limit: int, slots: int) -> list[str]:
+    """aria2c args giving one of ``slots`` concurrent jobs its share of ``limit``."""
+    if not limit:
+        return []
+    share = max(limit // max(slots, 1), 1024)
+    return [f"--max-overall-download-limit={share // 1024}K"]
+
+
+def download_key(settings: dict, url: str) -> tuple[str, str, str]:
+    """(video id, quality, mode) under which ``url``'s pages are indexed."""
+    return (
+        video_id_from_url(url),
+        str(settings.get("dfn_priority", "")).strip(),
+        settings.get("download_mode") or "video",
+    )
+
+
+def requested_pages(settings: dict) -> list[int] | None:
+    """Pages the page chooser asks for; None means all / not known up front."""
+    page_type = int(settings.get("page_type", 0))
+    if page_type == 0:
+        return [1]
+    if page_type == 2:
+        return parse_page_spec(str(settings.get("page_value", "")))
+    return None
+
+
+def build_command(settings: dict, url: str, tools: dict, index=None) -> list[str]:
+    """Turn ``settings`` (config.json keys) into a BBDown argv for ``url``.
+
+    With a DownloadIndex (and ``skip_downloaded`` on) the page selection is
+    narrowed to the pages still missing. Raises CommandError when a setting
+    is missing or malformed, AlreadyDownloaded when nothing is missing.
+    """
+    url = url.split("?")[0]
+
+    cmd = [tools["bbdown"]]
+
+    # "mp3" downloads audio and converts each part as soon as it lands
+    if settings.get("download_mode") in ("audio", "mp3"):
+        cmd.append("--audio-only")
+
+    cmd += ["--use-aria2c", "--ffmpeg-path", tools["ffmpeg"], "--aria2c-path", tools["aria2c"]]
+
+    aria2c_args = [f"--{k}={v}" for k, v in aria2c_options(settings).items()]
+    if aria2c_args:
+        cmd += ["--aria2c-args", " ".join(aria2c_args)]
+    # validated here, applied per job at start time (see bandwidth_share)
+    parse_rate(settings.get("bandwidth_limit"))
+
+    # page chooser
+    page_type = int(settings.get("page_type", 0))
+    page_args = []
+    if page_type == 1:
+        page_args = ["-p", "ALL"]
+    elif page_type == 2:
+        page = str(settings.get("page_value", "")).strip()
+        if not page:
+            raise CommandError("Please enter the page(s).")
+        page_args = ["--select-page", page]
+
+    if index is not None and settings.get("skip_downloaded"):
+        requested = requested_pages(settings)
+        missing = index.missing_pages(*download_key(settings, url), requested)
+        if missing == []:
+            raise AlreadyDownloaded(url)
+        if missing is not None and missing != requested:
+            page_args = ["--select-page", format_page_ranges(missing)]
+    cmd += page_args
+
+    # delay
+    if settings.get("delay_enabled"):
+        delay = str(settings.get("delay_seconds", "")).strip()
+        if not delay:
+            raise CommandError("Please enter delay seconds.")
+        cmd += ["--delay-per-page", delay]
+
+    # flags
+    if settings.get("force_http"): cmd.append("--force-http")
+    if settings.get("download_danmaku"): cmd.append("--download-danmaku")
+    if settings.get("video_ascending"): cmd.append("--video-ascending")
+    if settings.get("audio_ascending"): cmd.append("--audio-ascending")
+    if settings.get("allow_pcdn"): cmd.append("--allow-pcdn")
+
+    # encoding priority
+    encoding = str(settings.get("encoding_priority", "")).strip()
+    if encoding:
+        if not re.fullmatch(r"[a-zA-Z0-9,]+", encoding):
+            raise CommandError("Encoding format invalid. Example: hevc,av1,avc")
+        cmd += ["--encoding-priority", encoding]
+
+    # quality priority
+    dfn = str(settings.get("dfn_priority", "")).strip()
+    if dfn:
+        cmd += ["--dfn-priority", dfn]
+
+    cmd.append(url)
+    return cmd
+
+
+# ============================================================
+# Progress Parsing
+# ============================================================
+
+SIZE_UNITS = {"B": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "TiB": 1024 ** 4}
+
+# [#2089b0 400.0KiB/33.2MiB(1%) CN:16 DL:115.7KiB ETA:4m51s]
+ARIA2_RE = re.compile(
+    r"\[#\w+ ([\d.]+)(\w*B)/([\d.]+)(\w*B)\((\d+)%\)"
+    r"(?: CN:\d+)?(?: SD:\d+)?(?: DL:([\d.]+)(\w*B))?(?: ETA:(\w+))?"
+)
+ARIA2_ETA_RE = re.compile(r"(\d+)([hms])")
+
+FFMPEG_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+FFMPEG_TIME_RE = re.compile(r"time=\s*(-?\d+):(\d+):(\d+(?:\.\d+)?)")
+FFMPEG_SPEED_RE = re.compile(r"speed=\s*([\d.]+)x")
+
+BBDOWN_PART_RE = re.compile(r"P(\d+)")
+BBDOWN_AID_RE = re.compile(r"获取aid结束:\s*(\d+)")
+BBDOWN_OF_RE = re.compile(r"\((\d+) of (\d+)\)")
+PERCENT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+
+# BBDown log message → stage; the first match wins
+BBDOWN_STAGES = (
+    ("获取aid", "info"),
+    ("获取视频信息", "info"),
+    ("开始解析", "parse"),
+    ("合并", "mux"),
+    ("视频...", "video"),
+    ("音频...", "audio"),
+    ("任务完成", "done"),
+)
+
+
+def _hms_seconds(h: str, m: str, sec: str) -> float:
+    return int(h) * 3600 + int(m) * 60 + float(sec)
+
+
+def _aria2_eta(value: str) -> float:
+    return sum(int(n) * {"h": 3600, "m": 60, "s": 1}[u] for n, u in ARIA2_ETA_RE.findall(value))
+
+
+class ProgressEvent:
+    """One progress update. ``done``/``total``/``speed`` are in bytes for
+    downloads and in media seconds for ffmpeg (``unit`` says which)."""
+
+    __slots__ = ("stage", "part", "parts", "done", "total", "unit", "speed", "eta")
+
+    def __init__(self, stage, part, parts, done=0.0, total=0.0, unit="B", speed=0.0, eta=None):
+        self.stage = stage
+        self.part = part
+        self.parts = parts
+        self.done = done
+        self.total = total
+        self.unit = unit
+        self.speed = speed
+        self.eta = eta
+
+    @property
+    def percent(self) -> float:
+        return min(self.done / self.total * 100, 100.0) if self.total else 0.0
+
+    def __repr__(self):
+        return (
+            f"ProgressEvent(stage={self.stage!r}, part={self.part}, parts={self.parts}, "
+            f"done={self.done}, total={self.total}, unit={self.unit!r}, speed={self.speed}, eta={self.eta})"
+        )
+
+
+class ProgressParser:
+    """Incremental parser for BBDown, aria2c and ffmpeg output.
+
+    ``feed`` takes one output line and returns a ProgressEvent, or None
+    when the line carries no progress. Cheap substring checks gate every
+    regex so non-progress lines cost almost nothing.
+    """
+
+    def __init__(self, stage: str = ""):
+        self.stage = stage
+        self.part = 0
+        self.parts = 0
+        self.duration = 0.0
+        # BBDown pages in the order they were started
+        self.pages_seen: list[int] = []
+        # names BBDown's temp folder
+        self.aid = ""
+
+    def feed(self, line: str) -> ProgressEvent | None:
+        if "[#" in line:
+            return self._feed_aria2(line)
+        if "time=" in line:
+            return self._feed_ffmpeg(line)
+        if "Duration:" in line:
+            m = FFMPEG_DURATION_RE.search(line)
+            if m and not self.duration:
+                self.duration = _hms_seconds(*m.groups())
+            return None
+        if "] - " in line:
+            return self._feed_bbdown(line)
+        # ffmpeg's progress is its time=; a % it prints ("muxing overhead") isn't
+        if "%" in line and not self.duration:
+            m = PERCENT_RE.search(line)
+            if m:
+                return ProgressEvent(self.stage, self.part, self.parts, float(m.group(1)), 100.0, unit="%")
+        return None
+
+    def _feed_aria2(self, line: str) -> ProgressEvent | None:
+        m = ARIA2_RE.search(line)
+        if not m:
+            return None
+        done_n, done_u, total_n, total_u, _, speed_n, speed_u, eta = m.groups()
+        done = float(done_n) * SIZE_UNITS.get(done_u, 1)
+        total = float(total_n) * SIZE_UNITS.get(total_u, 1)
+        speed = float(speed_n) * SIZE_UNITS.get(speed_u, 1) if speed_n else 0.0
+        return ProgressEvent(
+            self.stage, self.part, self.parts, done, total,
+            speed=speed, eta=_aria2_eta(eta) if eta else None,
+        )
+
+    def _feed_ffmpeg(self, line: str) -> ProgressEvent | None:
+        m = FFMPEG_TIME_RE.search(line)
+        if not m or m.group(1).startswith("-"):
+            return None
+        done = _hms_seconds(*m.groups())
+        s = FFMPEG_SPEED_RE.search(line)
+        speed = float(s.group(1)) if s else 0.0
+        eta = (self.duration - done) / speed if speed and self.duration else None
+        return ProgressEvent(self.stage, self.part, self.parts, done, self.duration, unit="s", speed=speed, eta=eta)
+
+    def _feed_bbdown(self, line: str) -> ProgressEvent | None:
+        message = line.split("] - ", 1)[1]
+        for keyword, stage in BBDOWN_STAGES:
+            if keyword in message:
+                break
+        else:
+            return None
+
+        self.stage = stage
+        if stage == "info" and not self.aid:
+            m = BBDOWN_AID_RE.search(message)
+            if m:
+                self.aid = m.group(1)
+        if stage in ("parse", "video", "audio"):
+            m = BBDOWN_PART_RE.search(message)
+            if m:
+                self.part = int(m.group(1))
+                if self.part not in self.pages_seen:
+                    self.pages_seen.append(self.part)
+        m = BBDOWN_OF_RE.search(message)
+        if m:
+            self.parts = int(m.group(2))
+        return ProgressEvent(stage, self.part, self.parts)
+
+
+# ============================================================
+# Jobs
+# ============================================================
+
+class Job:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    PAUSED = "paused"
+    WAITING = "waiting"    # queued, but not admitted yet (disk space)
+    CANCELLED = "cancelled"
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+    def __init__(self, job_id: int, url: str, cmd: list[str], settings: dict | None = None):
+        self.id = job_id
+        self.url = url
+        self.cmd = cmd
+        # snapshot of the settings the command was built from
+        self.settings = settings or {}
+        # total rate for all running jobs; this job's share is fixed when it starts
+        self.bandwidth_limit = parse_rate(self.settings.get("bandwidth_limit"))
+        # the scheduler's worker count when the job started: the number of
+        # shares its bandwidth and ffmpeg thread budgets are split into
+        self.concurrency = 1
+        self.started_at = 0.0
+        # "download" or "convert"; labels the job's metrics
+        self.kind = "download"
+        self.retries = 0
+        self.metrics: JobMetrics | None = None
+        # CDN host of the current run, when host selection is on
+        self.upos_host: str | None = None
+        # where the output ends up, and the job's own folder BBDown writes it in first
+        self.dest_dir = os.getcwd()
+        self.work_dir = self.dest_dir
+        # the video's aid, which names BBDown's temp folder in work_dir
+        self.aid = ""
+        # page → (path, size) of the files moved out of work_dir so far
+        self.outputs: dict[int, tuple[str, int]] = {}
+        # estimated peak disk use in bytes; None until estimated
+        self.disk_needed: int | None = None
+        self.priority = self.settings.get("download_priority") or "normal"
+        # the running tool, for cancel / pause
+        self.process: subprocess.Popen | None = None
+        self.cancel_event = threading.Event()
+        # paused before it started: the scheduler passes over it
+        self.held = False
+        self.state = Job.QUEUED
+        self.progress: ProgressEvent | None = None
+        self.returncode = None
+        self.log = deque(maxlen=JOB_LOG_LINES)
+        self._last_progress_ui = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def update_progress(self, event: ProgressEvent) -> bool:
+        """Store ``event``; returns True when the UI should be refreshed."""
+        previous = self.progress
+        self.progress = event
+        now = time.perf_counter()
+        if previous is None or previous.stage != event.stage or previous.part != event.part:
+            self._last_progress_ui = now
+            return True
+        if now - self._last_progress_ui >= PROGRESS_UI_INTERVAL:
+            self._last_progress_ui = now
+            return True
+        return False
+
+    def progress_columns(self) -> tuple[str, str, str, str]:
+        """(stage, percent, speed, eta) as shown in the job list."""
+        p = self.progress
+        if p is None:
+            return "", "", "", ""
+        stage = p.stage
+        if p.part:
+            stage = f"P{p.part}/{p.parts} {stage}" if p.parts else f"P{p.part} {stage}"
+        percent = f"{p.percent:.0f}%" if p.total else ""
+        if not p.speed:
+            speed = ""
+        elif p.unit == "B":
+            speed = f"{format_size(p.speed)}/s"
+        else:
+            speed = f"{p.speed:.1f}x"
+        return stage, percent, speed, format_eta(p.eta)
+
+    def append_log(self, line: str):
+        # a progress redraw replaces the previous redraw instead of piling up
+        if self.log and self.log[-1].endswith("\r"):
+            self.log[-1] = line
+        else:
+            self.log.append(line)
+
+
+class JobScheduler:
+    """Runs queued jobs on worker threads, at most ``max_workers`` at once.
+
+    ``run_job(job)`` returns True on success, or raises JobDeferred to put
+    the job back in the queue; ``on_change(job)`` is called from the worker
+    thread whenever a job changes state. ``admit(job)``, if set, must be
+    quick: a queued job starts only once it returns True, and refused jobs
+    are checked again every ADMIT_RECHECK seconds.
+    """
+
+    def __init__(self, run_job, on_change, max_workers: int = DEFAULT_MAX_JOBS, admit=None):
+        self.run_job = run_job
+        self.on_change = on_change
+        self.max_workers = max_workers
+        self.admit = admit
+        self._pending: deque[Job] = deque()
+        self._active: set[Job] = set()
+        self._running = 0
+        self._unfinished = 0
+        self._recheck: threading.Timer | None = None
+        self._lock = threading.Condition()
+
+    def submit(self, job: Job):
+        with self._lock:
+            self._pending.append(job)
+            self._unfinished += 1
+        self._dispatch()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until every submitted job has finished, or ``timeout`` seconds passed.
+
+        Returns True if they all finished.
+        """
+        with self._lock:
+            return self._lock.wait_for(lambda: not self._unfinished, timeout)
+
+    def set_max_workers(self, n: int):
+        self.max_workers = max(1, n)
+        self._dispatch()
+
+    def cancel(self, job: Job, block: bool = False) -> bool:
+        """Drop a queued job, or stop a running one with its process tree.
+
+        The tree is killed on a helper thread unless ``block`` is set.
+        """
+        with self._lock:
+            queued = job in self._pending
+            if queued:
+                self._pending.remove(job)
+                self._unfinished -= 1
+                self._lock.notify_all()
+            elif job not in self._active:
+                return False
+            job.cancel_event.set()
+            process = job.process
+
+        if queued:
+            job.state = Job.CANCELLED
+            self.on_change(job)
+        elif process is not None and block:
+            kill_tree(process)
+        elif process is not None:
+            # kill_tree waits out a grace period; keep the caller responsive
+            threading.Thread(target=kill_tree, args=(process,), daemon=True).start()
+        return True
+
+    def pause(self, job: Job) -> bool:
+        """Hold a queued job, or suspend a running one's process tree."""
+        with self._lock:
+            if job.state == Job.PAUSED:
+                return False
+            if job in self._pending:
+                job.held = True
+            elif job in self._active and job.process is not None:
+                suspend_tree(job.process)
+            else:
+                return False
+            job.state = Job.PAUSED
+        self.on_change(job)
+        return True
+
+    def resume(self, job: Job) -> bool:
+        with self._lock:
+            if job.state != Job.PAUSED:
+                return False
+            if job in self._pending:
+                job.held = False
+                job.state = Job.QUEUED
+            else:
+                if job.process is not None:
+                    resume_tree(job.process)
+                job.state = Job.RUNNING
+        self.on_change(job)
+        self._dispatch()
+        return True
+
+    def _dispatch(self):
+        with self._lock:
+            started, refused = [], []
+            candidates = [j for j in self._pending if not j.held]
+            while self._running < self.max_workers and candidates:
+                job = candidates.pop(0)
+                # a smaller job may still fit where this one doesn't
+                if self.admit is not None and not self.admit(job):
+                    refused.append(job)
+                    continue
+                self._pending.remove(job)
+                self._active.add(job)
+                self._running += 1
+                started.append(job)
+
+            # a share fixed for the job's lifetime must hold with every slot
+            # busy, or jobs started on an emptier queue add up past the budget
+            for job in started:
+                job.concurrency = self.max_workers
+
+            refused = [j for j in refused if j.state != Job.WAITING]
+            for job in refused:
+                job.state = Job.WAITING
+            if any(j.state == Job.WAITING for j in self._pending) and self._recheck is None:
+                self._recheck = threading.Timer(ADMIT_RECHECK, self._on_recheck)
+                self._recheck.daemon = True
+                self._recheck.start()
+
+        for job in refused:
+            self.on_change(job)
+        for job in started:
+            threading.Thread(target=self._worker, args=(job,), daemon=True).start()
+
+    def _on_recheck(self):
+        with self._lock:
+            self._recheck = None
+        self._dispatch()
+
+    def _worker(self, job: Job):
+        job.state = Job.RUNNING
+        self.on_change(job)
+        try:
+            ok = self.run_job(job)
+        except JobDeferred as e:
+            job.append_log(f"{e}\n")
+            with self._lock:
+                self._running -= 1
+                self._active.discard(job)
+                # back at the front, ahead of jobs that haven't been tried
+                self._pending.appendleft(job)
+                job.state = Job.QUEUED
+            self._dispatch()
+            return
+        except Exception as e:
+            job.append_log(f"{e}\n")
+            ok = False
+        finally:
+            with self._lock:
+                if job in self._active:
+                    self._running -= 1
+                    self._active.discard(job)
+
+        if job.cancelled:
+            job.state = Job.CANCELLED
+        else:
+            job.state = Job.DONE if ok else Job.FAILED
+        self.on_change(job)
+        self._dispatch()
+
+        with self._lock:
+            self._unfinished -= 1
+            self._lock.notify_all()
+
+
+class PartTracker:
+    """Works out from a job's progress events when each BBDown part is done.
+
+    A part is finished once BBDown moves on to the next one or reports the
+    task complete.
+    """
+
+    def __init__(self):
+        self.current = 0
+
+    def feed(self, event: ProgressEvent | None) -> list[int]:
+        if event is None:
+            return []
+        if event.stage == "done":
+            finished = [self.current] if self.current else []
+            self.current = 0
+            return finished
+        if event.part and event.part != self.current:
+            finished = [self.current] if self.current else []
+            self.current = event.part
+            return finished
+        return []
+
+
+def run_job_process(job: Job, on_progress=None, on_line=None, encoding=None, parser=None) -> int:
+    """Run ``job.cmd``, feeding its merged output through a ProgressParser.
+
+    ``on_line(line)`` sees every output line; ``on_progress(job)`` is
+    called whenever the job's progress should be redrawn. Returns the
+    exit code, which is also stored on the job.
+    """
+    cmd = with_aria2c_args(job.cmd, bandwidth_share(job.bandwidth_limit, job.concurrency))
+    job.started_at = time.time()
+    # a retry adds a run to the job's metrics rather than replacing them
+    if job.metrics is None:
+        job.metrics = JobMetrics(job.kind)
+    metrics = job.metrics
+    metrics.start()
+    try:
+        process = subprocess.Popen(
+            governed_command(cmd, job.priority),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            **popen_options(job.priority),
+        )
+    except OSError:
+        metrics.finish(None)
+        raise
+    assert process.stdout is not None
+    job.process = process
+    if job.cancelled:
+        # cancelled while it was being started
+        kill_tree(process)
+
+    parser = parser or ProgressParser()
+    first = True
+    for line in open_output(process.stdout, encoding=encoding):
+        if first:
+            metrics.first_output()
+            first = False
+        job.append_log(line)
+        if on_line:
+            on_line(line)
+        event = parser.feed(line)
+        job.aid = job.aid or parser.aid
+        if event:
+            metrics.feed(event)
+            if job.update_progress(event) and on_progress:
+                on_progress(job)
+
+    job.returncode = process.wait()
+    job.process = None
+    metrics.finish(job.returncode)
+    return job.returncode
+
+
+def open_index(settings: dict, config_path: str = CONFIG_PATH) -> DownloadIndex | None:
+    try:
+        return DownloadIndex(settings.get("index_path") or data_path(INDEX_FILE, config_path))
+    except Exception as e:
+        print("Failed to open download index:", e, file=sys.stderr)
+        return None
+
+
+def open_host_selector(settings: dict, config_path: str = CONFIG_PATH) -> HostSelector | None:
+    if not settings.get("upos_select"):
+        return None
+    return HostSelector(
+        settings.get("upos_hosts") or DEFAULT_UPOS_HOSTS,
+        data_path(HOST_CACHE_FILE, config_path),
+        ttl=float(settings.get("upos_probe_ttl", 3600)),
+        probe_path=settings.get("upos_probe_path") or "/",
+        probe_bytes=int(settings.get("upos_probe_bytes", 262144)),
+        timeout=float(settings.get("upos_probe_timeout", 3.0)),
+        default_scheme="http" if settings.get("force_http") else "https",
+    )
+
+
+def record_download(index, job: Job, parser: ProgressParser, pages: list[int] | None = None):
+    """Add the pages a BBDown run fetched (all it saw, or ``pages``) to ``index``.
+
+    Paths and sizes come from ``job.outputs``, the files this job moved out
+    of its own work folder; other downloads share the destination.
+    """
+    pages = pages or parser.pages_seen or requested_pages(job.settings) or []
+    if not pages:
+        return
+
+    video_id, quality, mode = download_key(job.settings, job.url)
+    outputs = {page: job.outputs[page] for page in pages if page in job.outputs}
+    # only an un-narrowed "-p ALL" run tells us how many pages the video has
+    page_count = parser.parts if "-p" in job.cmd else 0
+    index.record(video_id, quality, mode, pages, outputs, page_count)
+
+
+# ============================================================
+# Retries
+# ============================================================
+
+def attempt_pages(job: Job, parser: ProgressParser) -> list[int] | None:
+    """Pages the run of ``job.cmd`` that just ended asked for; None if unknown."""
+    if "--select-page" in job.cmd:
+        return parse_page_spec(job.cmd[job.cmd.index("--select-page") + 1])
+    if "-p" in job.cmd:
+        # "-p ALL": known once BBDown printed "(n of N)"
+        return list(range(1, parser.parts + 1)) if parser.parts else None
+    return [1]
+
+
+def finished_pages(job: Job, parser: ProgressParser, pages: list[int] | None) -> list[int]:
+    """Pages of the run that just ended that BBDown got through.
+
+    A page counts once its file is in the job's work folder or BBDown has
+    moved on to the next page, so a non-zero exit code alone doesn't
+    discard them.
+    """
+    if job.returncode == 0:
+        return pages or parser.pages_seen or requested_pages(job.settings) or []
+    done = set(parser.pages_seen[:-1])
+    if pages:
+        found = find_outputs(job.work_dir, job.started_at, pages, job.aid)
+        p = job.progress
+        if p is not None and p.stage == "mux":
+            # stopped while muxing: that page's file is half-written
+            found.pop(p.part or 1, None)
+        done.update(found)
+    return sorted(done)
+
+
+def retry_delay(settings: dict, attempt: int) -> float:
+    """Exponential backoff with jitter, so parallel jobs don't retry in step."""
+    base = float(settings.get("retry_backoff", 5.0))
+    cap = float(settings.get("retry_backoff_max", 120.0))
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def retry_command(cmd: list[str], pages: list[int] | None) -> list[str]:
+    """``cmd`` narrowed to ``pages`` (all when None), resuming partial segments."""
+    cmd = list(cmd)
+    if pages:
+        for flag in ("-p", "--select-page"):
+            if flag in cmd:
+                i = cmd.index(flag)
+                del cmd[i:i + 2]
+        # keep the URL last
+        cmd[-1:-1] = ["--select-page", format_page_ranges(pages)]
+    if "--continue=true" not in " ".join(cmd):
+        cmd = with_aria2c_args(cmd, RESUME_ARIA2C_ARGS)
+    return cmd
+
+
+# ============================================================
+# Scratch staging
+# ============================================================
+
+def prepare_work_dir(job: Job):
+    """Point BBDown at a fresh folder of the job's own, under scratch_dir or the destination.
+
+    Whatever lands there was written by this job, so its pages are told
+    apart from those of other videos downloading into the same folder.
+    """
+    if job.work_dir != job.dest_dir:
+        return
+    root = job.settings.get("scratch_dir") or job.dest_dir
+    job.work_dir = os.path.join(os.path.abspath(root), f"{JOB_DIR_PREFIX}{os.getpid()}-{job.id}")
+    os.makedirs(job.work_dir, exist_ok=True)
+    if "--work-dir" in job.cmd:
+        i = job.cmd.index("--work-dir")
+        del job.cmd[i:i + 2]
+    # keep the URL last
+    job.cmd[-1:-1] = ["--work-dir", job.work_dir]
+
+
+def publish_outputs(job: Job, pages: list[int], rest: bool = False) -> dict[int, tuple[str, int]]:
+    """Move the finished files of ``pages`` to the destination; page → (path, size).
+
+    With ``rest``, once BBDown has exited, everything else it wrote goes
+    too: danmaku, subtitles, covers, and after a clean exit any media not
+    matched to a page. BBDown's temp folder and, after a failed run, the
+    media of unfinished pages stay behind.
+    """
+    outputs = find_outputs(job.work_dir, job.started_at, pages, job.aid)
+    if job.work_dir == job.dest_dir:
+        return outputs
+    published = {}
+    for page, (path, size) in outputs.items():
+        moved = _publish(job, path)
+        if moved:
+            published[page] = (moved, size)
+    job.outputs.update(published)
+    if rest:
+        for path in _work_files(job):
+            if job.returncode != 0 and path.lower().endswith(MEDIA_EXTS):
+                continue
+            _publish(job, path)
+    return published
+
+
+def _publish(job: Job, path: str) -> str | None:
+    target = os.path.join(job.dest_dir, os.path.relpath(path, job.work_dir))
+    try:
+        return move_file(path, target)
+    except OSError as e:
+        job.append_log(f"Failed to move {path} to {target}: {e}\n")
+        return None
+
+
+def drop_partial_outputs(job: Job, keep=()) -> list[str]:
+    """Remove the media left in the job's work folder once its finished pages are out.
+
+    ``keep`` lists files to leave alone: finished pages that could not be
+    moved out.
+    """
+    removed = []
+    if job.work_dir == job.dest_dir:
+        return removed
+    for path in _work_files(job):
+        if path.lower().endswith(MEDIA_EXTS) and path not in keep:
+            try:
+                os.remove(path)
+                removed.append(path)
+            except OSError:
+                pass
+    return removed
+
+
+def _work_files(job: Job) -> list[str]:
+    files = []
+    for dirpath, dirnames, names in os.walk(job.work_dir):
+        if dirpath == job.work_dir:
+            dirnames[:] = [d for d in dirnames if d != job.aid]
+        files += [os.path.join(dirpath, name) for name in names]
+    return files
+
+
+def release_work_dir(job: Job):
+    """Remove the job's work folder, once only BBDown's temp folder is left in it.
+
+    Anything else means a file could not be moved out. The folder is then
+    kept, renamed to "bbdown-kept-*" so it isn't taken for a leftover work
+    folder, and ``job.work_dir`` is left pointing at it.
+    """
+    if job.work_dir == job.dest_dir:
+        return
+    if job.aid:
+        shutil.rmtree(os.path.join(job.work_dir, job.aid), ignore_errors=True)
+    # the folders of multi-part videos, emptied as their pages were moved out
+    for dirpath, _, _ in os.walk(job.work_dir, topdown=False):
+        try:
+            os.rmdir(dirpath)
+        except OSError:
+            pass
+    if os.path.exists(job.work_dir):
+        name = os.path.basename(job.work_dir)[len(JOB_DIR_PREFIX):]
+        kept = os.path.join(os.path.dirname(job.work_dir), KEPT_DIR_PREFIX + name)
+        try:
+            os.rename(job.work_dir, kept)
+            job.work_dir = kept
+        except OSError:
+            pass
+        job.append_log(f"Kept {job.work_dir}: it holds files that could not be moved out.\n")
+        return
+    job.work_dir = job.dest_dir
+
+
+def open_collection_sync(settings: dict, config_path: str = CONFIG_PATH) -> CollectionSync:
+    return CollectionSync(
+        data_path(SYNC_STATE_FILE, config_path),
+        BiliClient(settings.get("sync_cookie") or ""),
+        initial_limit=int(settings.get("sync_initial_limit", 0)),
+    )
+
+
+def open_space_governor(settings: dict) -> SpaceGovernor | None:
+    if not settings.get("space_check"):
+        return None
+    sizes = []
+    for key in ("space_reserve", "space_margin"):
+        try:
+            sizes.append(parse_size(settings.get(key), key))
+        except CommandError as e:
+            # a typo in config.json shouldn't keep the app from starting
+            print(f"{e}; using {DEFAULT_SETTINGS[key]}", file=sys.stderr)
+            sizes.append(parse_size(DEFAULT_SETTINGS[key], key))
+    return SpaceGovernor(*sizes)
+
+
+# ============================================================
+# Downloads
+# ============================================================
+
+def run_download(job: Job, run_once, on_retry=None, index=None,
+                 hosts: HostSelector | None = None) -> list[int] | None:
+    """Run a BBDown job, fetching failed pages again with backoff.
+
+    ``run_once(job)`` runs ``job.cmd`` once and returns its ProgressParser,
+    or None when BBDown could not be started. ``on_retry(job, pages,
+    delay)`` hears about each retry before its wait; ``pages`` is None when
+    the whole command is repeated. Finished pages are added to ``index``
+    after every run. With ``hosts``, every run goes to the best CDN host
+    at that moment and reports back how it went, so a retry after a
+    degraded host uses the next one. BBDown works in a folder of the job's
+    own (under scratch_dir, or inside the destination); finished pages are
+    moved out after each run and the folder is removed at the end, so a
+    cancelled job leaves no temp folder or half-written file behind. A
+    page whose file can't be moved out is not retried or indexed; its file
+    stays in the folder, which is then kept (see release_work_dir).
+
+    Returns the pages that could not be fetched: [] when none are missing,
+    None when the job failed before its page list was known.
+    """
+    prepare_work_dir(job)
+    try:
+        return _run_attempts(job, run_once, on_retry, index, hosts)
+    finally:
+        release_work_dir(job)
+
+
+def _run_attempts(job: Job, run_once, on_retry, index, hosts) -> list[int] | None:
+    attempts = int(job.settings.get("retry_attempts", 0))
+    while True:
+        if hosts is not None:
+            job.upos_host = hosts.best()
+            job.cmd = with_upos_host(job.cmd, job.upos_host)
+        parser = run_once(job)
+        if parser is None:
+            return None
+        if job.upos_host and not job.cancelled:
+            hosts.report(job.upos_host, job.returncode == 0, job.metrics.run_speed if job.metrics else 0.0)
+
+        pages = attempt_pages(job, parser)
+        done = finished_pages(job, parser, pages)
+        # finished pages are kept even when the job was cancelled
+        publish_outputs(job, done, rest=True)
+        # the destination refused these: they stay in the work folder
+        stuck = find_outputs(job.work_dir, job.started_at, done, job.aid)
+        done = [page for page in done if page in job.outputs]
+        # BBDown would skip a half-written page on retry as already there
+        drop_partial_outputs(job, keep=[path for path, _ in stuck.values()])
+        if index is not None and done and not job.cancelled:
+            record_download(index, job, parser, pages=done)
+        if stuck:
+            # another run wouldn't get them moved out either
+            return sorted({*stuck, *(page for page in pages or [] if page not in done)})
+        if job.returncode == 0:
+            return []
+
+        failed = [page for page in pages if page not in done] if pages else None
+        if job.cancelled or failed == [] or job.retries >= attempts:
+            return failed
+
+        job.retries += 1
+        delay = retry_delay(job.settings, job.retries)
+        if on_retry:
+            on_retry(job, failed, delay)
+        if job.cancel_event.wait(delay):
+            return failed
+        job.cmd = retry_command(job.cmd, failed)
+
+
+def open_metrics(settings: dict, config_path: str = CONFIG_PATH) -> MetricsWriter | None:
+    if not settings.get("metrics_enabled"):
+        return None
+    return MetricsWriter(
+        settings.get("metrics_file") or data_path(METRICS_FILE, config_path),
+        settings.get("metrics_prom_file") or "",
+    )
+
+
+def record_metrics(writer: MetricsWriter | None, job: Job):
+    """Write ``job``'s metrics, if it ran a process and metrics are on.
+
+    Call once per job, after its last run: retries are part of the record.
+    """
+    if writer is not None and job.metrics is not None:
+        writer.write(job, job.metrics)
+
+
+def metrics_summary(metrics: JobMetrics) -> str:
+    """One line for the log, e.g. "12.3s, 45.6MiB, avg 3.7MiB/s, most in transfer (9.8s)"."""
+    parts = [f"{metrics.duration:.1f}s"]
+    if metrics.bytes:
+        parts.append(format_size(metrics.bytes))
+        parts.append(f"avg {format_size(metrics.avg_speed)}/s")
+    stages = {name: sec for name, sec in metrics.stages.items() if name != "finish"}
+    slowest = max(stages, key=stages.get)
+    if stages[slowest]:
+        parts.append(f"most in {slowest} ({stages[slowest]:.1f}s)")
+    return ", ".join(parts)
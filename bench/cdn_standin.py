@@ -0,0 +1,110 @@
+"""Local HTTP servers standing in for Bilibili's upos CDN hosts.
+
+Each one answers every GET, ranged or not, with zero bytes after an
+injected ``latency`` and at most ``rate`` bytes per second, so host
+selection can be exercised offline:
+
+    with StandinCDN(latency=0.05, rate=4 << 20) as fast, StandinCDN(latency=0.3) as slow:
+        selector = HostSelector([fast.address, slow.address], cache_path)
+
+``latency`` and ``rate`` may be changed while the server runs, to make
+a host degrade mid-session. Run as a script to keep a few up by hand:
+
+    python bench/cdn_standin.py 0.02:8M 0.2:1M 0.5:256K
+"""
+
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BODY_SIZE = 4 * 1024 * 1024
+CHUNK = 16 * 1024
+
+
+class StandinCDN:
+    def __init__(self, latency: float = 0.0, rate: float = 0.0, size: int = BODY_SIZE, port: int = 0):
+        self.latency = latency
+        self.rate = rate          # bytes per second, 0 = unthrottled
+        self.size = size
+        self.requests = 0
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                standin.requests += 1
+                time.sleep(standin.latency)
+
+                length = standin.size
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if match:
+                    first = int(match.group(1))
+                    last = int(match.group(2)) if match.group(2) else standin.size - 1
+                    length = max(0, min(last, standin.size - 1) - first + 1)
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {first}-{first + length - 1}/{standin.size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(length))
+                self.end_headers()
+
+                started = time.perf_counter()
+                sent = 0
+                while sent < length:
+                    chunk = min(CHUNK, length - sent)
+                    try:
+                        self.wfile.write(b"\0" * chunk)
+                    except OSError:
+                        return
+                    sent += chunk
+                    if standin.rate > 0:
+                        delay = started + sent / standin.rate - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.address = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> "StandinCDN":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _parse_rate(value: str) -> float:
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    value = value.strip().upper()
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value or 0)
+
+
+if __name__ == "__main__":
+    specs = sys.argv[1:] or ["0.02:8M", "0.2:1M"]
+    servers = []
+    for spec in specs:
+        latency, _, rate = spec.partition(":")
+        servers.append(StandinCDN(float(latency), _parse_rate(rate)).start())
+        print(f"{servers[-1].address}  latency={latency}s rate={rate or 'unthrottled'}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers:
+            server.stop()
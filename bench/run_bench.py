@@ -0,0 +1,530 @@
+"""Measure the app's own overhead against stub tools.
+
+BBDown, ffmpeg, ffprobe and aria2c are replaced by ``stub_tool.py``
+(see its docstring for the knobs), so runs are offline and repeatable.
+Everything happens in a scratch directory with its own config.json;
+the real config, index and caches are not touched.
+
+    python bench/run_bench.py -o bench.json
+    python bench/run_bench.py -o new.json --compare bench.json
+
+Headless benchmarks (parser, batch downloads, CDN host selection against
+``cdn_standin.py`` servers) always run. The GUI ones
+(log ingestion, process_url stall, event-loop latency, GUI download and
+conversion throughput, memory soak) need a display and are recorded as
+skipped without one.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from bbdown_core import (  # noqa: E402
+    DEFAULT_SETTINGS,
+    Job,
+    JobScheduler,
+    ProgressParser,
+    build_command,
+    run_job_process,
+    tool_paths,
+)
+from host_select import HostSelector  # noqa: E402
+
+from cdn_standin import StandinCDN  # noqa: E402
+
+STUB_TOOL = os.path.join(BENCH_DIR, "stub_tool.py")
+TOOL_NAMES = ("bbdown", "ffmpeg", "ffprobe", "aria2c")
+
+# event-loop probe: how often a tick is scheduled while the GUI is loaded
+TICK_MS = 5
+
+
+# ============================================================
+# Setup
+# ============================================================
+
+def make_stubs(directory: str) -> dict:
+    """Executable launchers for stub_tool.py, one per tool."""
+    paths = {}
+    for name in TOOL_NAMES:
+        if sys.platform.startswith("win"):
+            path = os.path.join(directory, f"{name}.cmd")
+            script = f'@"{sys.executable}" "{STUB_TOOL}" {name} %*\r\n'
+        else:
+            path = os.path.join(directory, name)
+            script = f'#!/bin/sh\nexec "{sys.executable}" "{STUB_TOOL}" {name} "$@"\n'
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(script)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+        paths[name] = path
+    return paths
+
+
+def bench_settings(stubs: dict, scratch: str, max_jobs: int) -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({f"{name}_path": path for name, path in stubs.items()})
+    settings.update({
+        "max_jobs": max_jobs,
+        "skip_downloaded": False,
+        "index_path": os.path.join(scratch, "downloads.db"),
+        "watch_enabled": False,
+        "download_mode": "video",
+    })
+    return settings
+
+
+def stub_env(**values):
+    for name, value in values.items():
+        os.environ[f"BENCH_{name.upper()}"] = str(value)
+
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "samples": len(ordered),
+        "p50_ms": round(at(0.50) * 1000, 3),
+        "p95_ms": round(at(0.95) * 1000, 3),
+        "p99_ms": round(at(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def rss_bytes() -> int | None:
+    """Resident set size of this process, or None where unknown."""
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm", "r", encoding="ascii") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+    if sys.platform.startswith("win"):
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+    return None
+
+
+def git_revision() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "-C", REPO_DIR, "describe", "--always", "--dirty"],
+            capture_output=True, text=True, timeout=10,
+        )
+        return result.stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+
+
+# ============================================================
+# Headless
+# ============================================================
+
+def bench_parser(lines: int) -> dict:
+    sample = [
+        "[2024-01-01 12:00:00.000] - 开始下载P1视频...\n",
+        "[#a1b2c3 12.00MiB/50.00MiB(24%) CN:16 DL:8.2MiB ETA:4s]\r",
+        "size=    1024kB time=00:00:10.00 bitrate= 192.0kbits/s speed=40.0x\r",
+        "  Duration: 00:03:00.00, start: 0.000000, bitrate: 192 kb/s\n",
+        "[2024-01-01 12:00:00.000] - 获取aid结束: 170001\n",
+        "plain output line\n",
+    ]
+    feed = (sample * (lines // len(sample) + 1))[:lines]
+    parser = ProgressParser()
+    started = time.perf_counter()
+    for line in feed:
+        parser.feed(line)
+    elapsed = time.perf_counter() - started
+    return {"lines": lines, "seconds": round(elapsed, 4), "lines_per_s": round(lines / elapsed)}
+
+
+def bench_batch_downloads(settings: dict, jobs: int, max_jobs: int) -> dict:
+    """The main-cli.py path: scheduler + run_job_process, no UI."""
+    tools = tool_paths(settings)
+    urls = [f"https://www.bilibili.com/video/BV1bench{i:05d}" for i in range(1, jobs + 1)]
+    batch = [Job(i, url, build_command(settings, url, tools), settings) for i, url in enumerate(urls, 1)]
+
+    lines = [0]
+    lock = threading.Lock()
+
+    def run_job(job: Job) -> bool:
+        count = 0
+
+        def on_line(line):
+            nonlocal count
+            count += 1
+
+        run_job_process(job, on_line=on_line)
+        with lock:
+            lines[0] += count
+        return job.returncode == 0
+
+    scheduler = JobScheduler(run_job, lambda job: None, max_jobs)
+    started = time.perf_counter()
+    for job in batch:
+        scheduler.submit(job)
+    scheduler.wait()
+    elapsed = time.perf_counter() - started
+
+    failed = sum(job.state != Job.DONE for job in batch)
+    return {
+        "jobs": jobs,
+        "max_jobs": max_jobs,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "jobs_per_s": round(jobs / elapsed, 2),
+        "lines_per_s": round(lines[0] / elapsed),
+    }
+
+
+def bench_host_selection(scratch: str) -> dict:
+    """Probe local stand-in CDN hosts; check the ranking, cache and fallback."""
+    # (latency, rate): the fast one, one slow to answer, one slow to send
+    specs = {"fast": (0.01, 0), "laggy": (0.25, 0), "narrow": (0.01, 256 * 1024)}
+    servers = {name: StandinCDN(latency, rate).start() for name, (latency, rate) in specs.items()}
+    try:
+        names = {server.address: name for name, server in servers.items()}
+        # nothing listens on port 9 (discard): an unreachable host must drop out
+        hosts = [*names, "http://127.0.0.1:9"]
+        cache = os.path.join(scratch, "host_cache.json")
+
+        selector = HostSelector(hosts, cache, ttl=3600, probe_bytes=256 * 1024, timeout=2.0)
+        started = time.perf_counter()
+        ranking = selector.ranking()
+        probe_seconds = time.perf_counter() - started
+
+        # a second session reads the ranking from the cache instead of probing
+        requests = sum(server.requests for server in servers.values())
+        cached = HostSelector(hosts, cache, ttl=3600).best()
+        probed_again = sum(server.requests for server in servers.values()) != requests
+
+        best = selector.best()
+        benched = selector.report(best, ok=False)
+        fallback = selector.best()
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    order = [names.get(entry["host"], entry["host"]) for entry in ranking]
+    return {
+        "probe_seconds": round(probe_seconds, 3),
+        "ranking": order,
+        "ranking_correct": order == ["fast", "laggy", "narrow"],
+        "cache_hit": cached == best and not probed_again,
+        "fallback": names.get(fallback, fallback) if benched else None,
+    }
+
+
+# ============================================================
+# GUI
+# ============================================================
+
+def load_gui_module():
+    spec = importlib.util.spec_from_file_location("bbdown_gui", os.path.join(REPO_DIR, "main-gui.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class LatencyProbe:
+    """Schedules a tick every TICK_MS and records how late each one fires."""
+
+    def __init__(self, root):
+        self.root = root
+        self.samples: list[float] = []
+        # bumped per run so ticks left over from an earlier run stop themselves
+        self._generation = 0
+
+    def start(self):
+        self.samples = []
+        self._generation += 1
+        self._schedule(self._generation)
+
+    def stop(self) -> dict:
+        self._generation += 1
+        return percentiles(self.samples)
+
+    def _schedule(self, generation: int):
+        expected = time.perf_counter() + TICK_MS / 1000
+        self.root.after(TICK_MS, self._tick, generation, expected)
+
+    def _tick(self, generation: int, expected: float):
+        if generation != self._generation:
+            return
+        self.samples.append(max(0.0, time.perf_counter() - expected))
+        self._schedule(generation)
+
+
+class GuiBench:
+
+    def __init__(self, gui_module, config_path: str, timeout: float):
+        self.gui = gui_module.BBDownGUI(config_path)
+        self.root = self.gui.root
+        self.timeout = timeout
+        self.probe = LatencyProbe(self.root)
+
+    def pump(self, until):
+        """Run the Tk event loop until ``until()`` is true."""
+        deadline = time.perf_counter() + self.timeout
+        while not until():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("benchmark phase timed out")
+            self.root.tk.dooneevent(0)
+
+    def close(self):
+        self.gui._on_close()
+
+    def startup(self) -> dict:
+        self.pump(lambda: "ready" in self.gui.startup_times)
+        return {name: round(seconds * 1000, 1) for name, seconds in self.gui.startup_times.items()}
+
+    def log_ingest(self, lines: int) -> dict:
+        done = threading.Event()
+        payload = "[#1] " + "x" * 80 + "\n"
+
+        def produce():
+            for _ in range(lines):
+                self.gui.log(payload)
+            self.gui.call_in_ui(done.set)
+
+        self.probe.start()
+        started = time.perf_counter()
+        self.gui._start_worker(produce)
+        self.pump(done.is_set)
+        elapsed = time.perf_counter() - started
+        return {
+            "lines": lines,
+            "seconds": round(elapsed, 3),
+            "lines_per_s": round(lines / elapsed),
+            "event_loop_latency": self.probe.stop(),
+        }
+
+    def _all_finished(self) -> bool:
+        return all(job.state in (Job.DONE, Job.FAILED) for job in self.gui.jobs.values())
+
+    def downloads(self, jobs: int) -> dict:
+        urls = "\n".join(f"https://www.bilibili.com/video/BV1bench{i:05d}" for i in range(1, jobs + 1))
+        self.gui.clear_finished_jobs()
+        self.gui.url_entry.delete("1.0", "end")
+        self.gui.url_entry.insert("1.0", urls)
+
+        self.probe.start()
+        started = time.perf_counter()
+        self.gui.process_url()
+        stall = time.perf_counter() - started
+        self.pump(self._all_finished)
+        elapsed = time.perf_counter() - started
+
+        failed = sum(job.state != Job.DONE for job in self.gui.jobs.values())
+        return {
+            "jobs": jobs,
+            "failed": failed,
+            "process_url_stall_ms": round(stall * 1000, 2),
+            "seconds": round(elapsed, 3),
+            "jobs_per_s": round(jobs / elapsed, 2),
+            "event_loop_latency": self.probe.stop(),
+        }
+
+    def conversions(self, files: int, work_dir: str) -> dict:
+        sources = []
+        for i in range(files):
+            path = os.path.join(work_dir, f"bench-{i:05d}.m4a")
+            with open(path, "wb") as f:
+                f.write(b"\0" * 4096)
+            sources.append(path)
+
+        self.gui.clear_finished_jobs()
+        stats = self.gui.convert_stats
+        self.probe.start()
+        started = time.perf_counter()
+        for path in sources:
+            self.gui.process_file(path)
+        self.pump(lambda: stats.idle)
+        elapsed = time.perf_counter() - started
+
+        return {
+            "files": files,
+            "workers": self.gui.convert_scheduler.max_workers,
+            "failed": stats.failed,
+            "seconds": round(elapsed, 3),
+            "jobs_per_s": round(files / elapsed, 2),
+            "event_loop_latency": self.probe.stop(),
+        }
+
+    def memory_soak(self, rounds: int, jobs: int) -> dict:
+        samples = []
+        for _ in range(rounds):
+            self.downloads(jobs)
+            self.gui.clear_finished_jobs()
+            # let the log trim and queued callbacks settle before sampling
+            self.pump(lambda: self.gui.ui_queue.empty())
+            samples.append(rss_bytes())
+
+        if None in samples:
+            return {"skipped": "process memory is not available on this platform"}
+        return {
+            "rounds": rounds,
+            "jobs_per_round": jobs,
+            "rss_first": samples[0],
+            "rss_last": samples[-1],
+            "rss_growth": samples[-1] - samples[0],
+            "rss_per_round": samples,
+        }
+
+
+def run_gui_benchmarks(args, settings: dict, scratch: str, work_dir: str) -> dict:
+    try:
+        gui_module = load_gui_module()
+    except ImportError as e:
+        return {"skipped": f"GUI import failed: {e}"}
+
+    config_path = os.path.join(scratch, "config.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(settings, f)
+
+    try:
+        bench = GuiBench(gui_module, config_path, args.timeout)
+    except Exception as e:  # tkinter.TclError without a display
+        return {"skipped": f"no display: {e}"}
+
+    results = {}
+    try:
+        results["startup_ms"] = bench.startup()
+        results["log_ingest"] = bench.log_ingest(args.log_lines)
+        results["gui_downloads"] = bench.downloads(args.jobs)
+        results["gui_conversions"] = bench.conversions(args.conversions, work_dir)
+        results["memory_soak"] = bench.memory_soak(args.soak_rounds, args.jobs)
+    finally:
+        bench.close()
+    return results
+
+
+# ============================================================
+# Compare
+# ============================================================
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old: dict, new: dict):
+    before = flatten(old.get("results", {}))
+    after = flatten(new.get("results", {}))
+    print(f"{'metric':<48} {'before':>14} {'after':>14} {'change':>9}")
+    for name in sorted(before.keys() & after.keys()):
+        a, b = before[name], after[name]
+        change = f"{(b - a) / a * 100:+.1f}%" if a else "-"
+        print(f"{name:<48} {a:>14} {b:>14} {change:>9}")
+
+
+# ============================================================
+# Entry
+# ============================================================
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark BBDown-GUI against stub tools.")
+    parser.add_argument("-o", "--output", default="bench-results.json", help="JSON file to write results to")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to print a comparison against")
+    parser.add_argument("--jobs", type=int, default=20, help="downloads per throughput run")
+    parser.add_argument("--max-jobs", type=int, default=4, help="parallel downloads")
+    parser.add_argument("--conversions", type=int, default=40, help="files per conversion run")
+    parser.add_argument("--log-lines", type=int, default=200000, help="lines pushed through log()")
+    parser.add_argument("--parser-lines", type=int, default=500000, help="lines fed to ProgressParser")
+    parser.add_argument("--stub-lines", type=int, default=200, help="progress lines per stub stage")
+    parser.add_argument("--stub-rate", type=float, default=0, help="stub lines per second, 0 = unthrottled")
+    parser.add_argument("--stub-size", type=int, default=65536, help="bytes per stub output file")
+    parser.add_argument("--soak-rounds", type=int, default=5, help="download rounds for the memory soak")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a phase is abandoned")
+    parser.add_argument("--no-gui", action="store_true", help="only run the headless benchmarks")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output)
+    scratch = tempfile.mkdtemp(prefix="bbdown-bench-")
+    work_dir = os.path.join(scratch, "work")
+    os.makedirs(work_dir)
+    cwd = os.getcwd()
+
+    stub_env(lines=args.stub_lines, rate=args.stub_rate, size=args.stub_size)
+    stubs = make_stubs(scratch)
+    settings = bench_settings(stubs, scratch, args.max_jobs)
+
+    results = {}
+    try:
+        # BBDown and the converter write next to the working directory
+        os.chdir(work_dir)
+        results["parser"] = bench_parser(args.parser_lines)
+        results["batch_downloads"] = bench_batch_downloads(settings, args.jobs, args.max_jobs)
+        results["host_selection"] = bench_host_selection(scratch)
+        if args.no_gui:
+            results["gui"] = {"skipped": "--no-gui"}
+        else:
+            results["gui"] = run_gui_benchmarks(args, settings, scratch, work_dir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""Offline stand-in for BBDown, ffmpeg, ffprobe and aria2c.
+
+Run as ``stub_tool.py <tool> [args...]``. It prints output shaped like
+the real tool's (what ProgressParser and video_info.parse_info expect)
+and writes dummy output files, without touching the network. The
+volume and pace come from the environment:
+
+    BENCH_LINES     progress lines per download / encode stage (200)
+    BENCH_RATE      lines per second, 0 = as fast as possible (0)
+    BENCH_SIZE      bytes written per output file (65536)
+    BENCH_PAGES     pages per video (1)
+    BENCH_TITLE     video title, which names the output files (Benchmark Video)
+    BENCH_DURATION  audio length in seconds reported to ffmpeg/ffprobe (180)
+    BENCH_EXIT      exit code of BBDown and ffmpeg (0)
+    BENCH_FAIL      pages BBDown fails on the first time they are tried in
+                    the working directory, e.g. "2,5" (none)
+"""
+
+import json
+import os
+import sys
+import time
+
+
+def _env(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+LINES = int(_env("BENCH_LINES", 200))
+RATE = _env("BENCH_RATE", 0)
+SIZE = int(_env("BENCH_SIZE", 65536))
+PAGES = max(1, int(_env("BENCH_PAGES", 1)))
+DURATION = _env("BENCH_DURATION", 180)
+EXIT = int(_env("BENCH_EXIT", 0))
+TITLE = os.environ.get("BENCH_TITLE") or "Benchmark Video"
+FAIL = {int(p) for p in os.environ.get("BENCH_FAIL", "").split(",") if p.strip().isdigit()}
+
+out = sys.stdout
+
+
+class Pacer:
+    """Sleeps so that lines go out at ``RATE`` per second on average."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+
+    def tick(self):
+        self.count += 1
+        if RATE > 0:
+            delay = self.started + self.count / RATE - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def bbdown_log(message: str):
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    out.write(f"[{stamp}.000] - {message}\n")
+
+
+def write_file(path: str):
+    with open(path, "wb") as f:
+        f.write(b"\0" * SIZE)
+
+
+def clock(seconds: float) -> str:
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:05.2f}"
+
+
+# ============================================================
+# BBDown
+# ============================================================
+
+def selected_pages(args: list[str]) -> list[int]:
+    if "--select-page" in args:
+        pages = []
+        for item in args[args.index("--select-page") + 1].split(","):
+            first, _, last = item.partition("-")
+            pages += range(int(first), int(last or first) + 1)
+        return pages
+    if "-p" in args:
+        return list(range(1, PAGES + 1))
+    return [1]
+
+
+def aria2_progress(pacer: Pacer):
+    total = SIZE / 1024 / 1024
+    for i in range(1, LINES + 1):
+        done = total * i / LINES
+        out.write(
+            f"[#a1b2c3 {done:.2f}MiB/{total:.2f}MiB({i * 100 // LINES}%) "
+            f"CN:16 DL:8.0MiB ETA:{max(LINES - i, 0) // 10}s]\r"
+        )
+        pacer.tick()
+
+
+def bbdown(args: list[str]) -> int:
+    bbdown_log("BBDown version 1.6.3, Bilibili Downloader.")
+    bbdown_log("获取aid...")
+    bbdown_log("获取aid结束: 170001")
+    bbdown_log("获取视频信息...")
+    bbdown_log(f"视频标题: {TITLE}")
+
+    if "--only-show-info" in args:
+        for page in range(1, PAGES + 1):
+            bbdown_log(f"P{page}: [{1000 + page}] [Part {page}] [03m00s]")
+        bbdown_log("共计 1 条视频流.")
+        bbdown_log("0. [1080P 高清] [1920x1080] [HEVC] [29.412] [1234 kbps] [~12.34 MB]")
+        bbdown_log("共计 1 条音频流.")
+        bbdown_log("0. [M4A] [192 kbps] [~3.21 MB]")
+        out.flush()
+        return 0
+
+    if "--work-dir" in args:
+        work_dir = args[args.index("--work-dir") + 1]
+        os.makedirs(work_dir, exist_ok=True)
+        os.chdir(work_dir)
+
+    audio_only = "--audio-only" in args
+    pages = selected_pages(args)
+    pacer = Pacer()
+    for n, page in enumerate(pages, 1):
+        bbdown_log(f"开始解析P{page}... ({n} of {len(pages)})")
+        # like BBDown's default names: "<title>" alone, "<title>/[P01]<part>" for a multi-part video
+        if PAGES > 1 or len(pages) > 1 or page > 1:
+            name = os.path.join(TITLE, f"[P{page:02d}]Part {page}")
+            os.makedirs(TITLE, exist_ok=True)
+        else:
+            name = TITLE
+        # kept in BBDown's temp folder (named after the aid), like its segments
+        marker = os.path.join("170001", f".bench-failed-P{page}")
+        if page in FAIL and not os.path.exists(marker):
+            # a transient CDN error: BBDown gives up on the whole run
+            os.makedirs("170001", exist_ok=True)
+            open(marker, "w").close()
+            aria2_progress(pacer)
+            bbdown_log("下载失败: The remote server returned an error: (403) Forbidden.")
+            out.flush()
+            return 1
+        if audio_only:
+            bbdown_log(f"开始下载P{page}音频...")
+            aria2_progress(pacer)
+            write_file(f"{name}.m4a")
+        else:
+            bbdown_log(f"开始下载P{page}视频...")
+            aria2_progress(pacer)
+            bbdown_log(f"开始下载P{page}音频...")
+            aria2_progress(pacer)
+            bbdown_log("开始合并音视频...")
+            write_file(f"{name}.mp4")
+        if "--download-danmaku" in args:
+            bbdown_log("下载弹幕Xml...")
+            write_file(f"{name}.xml")
+            bbdown_log("弹幕Xml转为Ass...")
+            write_file(f"{name}.ass")
+        out.flush()
+    bbdown_log("任务完成")
+    out.flush()
+    return EXIT
+
+
+# ============================================================
+# ffmpeg / ffprobe / aria2c
+# ============================================================
+
+OUTPUT_EXTS = (".mp3", ".opus", ".aac", ".m4a")
+
+
+def ffmpeg(args: list[str]) -> int:
+    out.write(f"Input #0, mov,mp4,m4a, from '{args[args.index('-i') + 1] if '-i' in args else ''}':\n")
+    out.write(f"  Duration: {clock(DURATION)}, start: 0.000000, bitrate: 192 kb/s\n")
+    pacer = Pacer()
+    for i in range(1, LINES + 1):
+        t = DURATION * i / LINES
+        out.write(f"size=  {int(t * 24)}kB time={clock(t)} bitrate= 192.0kbits/s speed=40.0x\r")
+        pacer.tick()
+    out.flush()
+    if EXIT == 0:
+        # every output file: media paths that aren't inputs
+        for i, arg in enumerate(args):
+            if arg.lower().endswith(OUTPUT_EXTS) and (i == 0 or args[i - 1] != "-i"):
+                write_file(arg)
+    return EXIT
+
+
+def ffprobe(args: list[str]) -> int:
+    path = args[-1] if args else ""
+    codec = {".mp3": "mp3", ".opus": "opus"}.get(os.path.splitext(path)[1].lower(), "aac")
+    json.dump({
+        "streams": [{"codec_type": "audio", "codec_name": codec, "bit_rate": "192000"}],
+        "format": {"duration": f"{DURATION:.6f}"},
+    }, out)
+    out.write("\n")
+    return 0
+
+
+def aria2c(args: list[str]) -> int:
+    out.write("aria2 version 1.37.0 (benchmark stub)\n")
+    return 0
+
+
+TOOLS = {"bbdown": bbdown, "ffmpeg": ffmpeg, "ffprobe": ffprobe, "aria2c": aria2c}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in TOOLS:
+        sys.stderr.write(f"usage: stub_tool.py {{{','.join(TOOLS)}}} [args...]\n")
+        sys.exit(2)
+    # BBDown output is read in the locale encoding, like the real console
+    sys.stdout.reconfigure(newline="")
+    sys.exit(TOOLS[sys.argv[1]](sys.argv[2:]))
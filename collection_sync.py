@@ -0,0 +1,265 @@
+"""Expand uploader spaces, favorites and series / seasons into video URLs.
+
+Each collection keeps a high-water mark in ``state_path``: the time of
+its newest video (publish time, or the time it was favorited) and the
+ids seen at exactly that time. The list APIs are asked for newest first
+and read one page at a time, so a sync stops at the first page that
+reaches the mark instead of enumerating the whole collection.
+
+Videos queued past the mark stay "pending" until their download is
+done, so a failed or interrupted one is offered again on the next sync.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from staging import write_atomic
+
+API_BASE = "https://api.bilibili.com"
+REQUEST_TIMEOUT = 15
+PAGE_SIZE = 30
+# pause between list pages, to stay clear of the API's rate limiting
+PAGE_DELAY = 0.3
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Referer": "https://www.bilibili.com/",
+}
+
+# (kind, pattern); "owner" is the uploader's mid, "id" the list's own id
+COLLECTION_PATTERNS = [
+    ("favorites", re.compile(r"space\.bilibili\.com/(?P<owner>\d+)/favlist\?(?:.*&)?fid=(?P<id>\d+)")),
+    ("favorites", re.compile(r"bilibili\.com/medialist/(?:detail|play)/ml(?P<id>\d+)")),
+    ("series", re.compile(r"space\.bilibili\.com/(?P<owner>\d+)/channel/seriesdetail\?(?:.*&)?sid=(?P<id>\d+)")),
+    ("season", re.compile(r"space\.bilibili\.com/(?P<owner>\d+)/channel/collectiondetail\?(?:.*&)?sid=(?P<id>\d+)")),
+    ("series", re.compile(r"space\.bilibili\.com/(?P<owner>\d+)/lists/(?P<id>\d+)\?(?:.*&)?type=series")),
+    ("season", re.compile(r"space\.bilibili\.com/(?P<owner>\d+)/lists/(?P<id>\d+)")),
+    ("space", re.compile(r"space\.bilibili\.com/(?P<id>\d+)(?:/(?:video|upload(?:/video)?)?)?/?(?:[?#].*)?$")),
+]
+
+# signed-query key shuffle used by the /wbi/ endpoints
+WBI_MIXIN_TABLE = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40, 61,
+    26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11, 36,
+    20, 34, 44, 52,
+]
+
+
+class SyncError(RuntimeError):
+    """A collection list couldn't be fetched."""
+
+
+def parse_collection_url(url: str) -> tuple[str, str, str] | None:
+    """(kind, owner mid, list id) for a collection URL; None for anything else."""
+    for kind, pattern in COLLECTION_PATTERNS:
+        m = pattern.search(url)
+        if m:
+            return kind, m.groupdict().get("owner") or "", m.group("id")
+    return None
+
+
+def video_url(bvid: str) -> str:
+    return f"https://www.bilibili.com/video/{bvid}"
+
+
+# ============================================================
+# API
+# ============================================================
+
+class BiliClient:
+    """Minimal JSON client for the list endpoints; signs /wbi/ requests."""
+
+    def __init__(self, cookie: str = "", base: str = API_BASE):
+        self.base = base
+        self.headers = dict(HEADERS, Cookie=cookie) if cookie else dict(HEADERS)
+        self._mixin_key = None
+
+    def get(self, path: str, params: dict) -> dict:
+        if "/wbi/" in path:
+            params = self._sign(params)
+        request = urllib.request.Request(
+            f"{self.base}{path}?{urllib.parse.urlencode(params)}", headers=self.headers
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                body = json.load(response)
+        except (OSError, ValueError) as e:
+            raise SyncError(f"{path}: {e}") from e
+        if body.get("code") != 0:
+            raise SyncError(f"{path}: {body.get('message') or body.get('code')}")
+        return body.get("data") or {}
+
+    def _sign(self, params: dict) -> dict:
+        if self._mixin_key is None:
+            img_key, sub_key = self._nav_keys()
+            raw = img_key + sub_key
+            self._mixin_key = "".join(raw[i] for i in WBI_MIXIN_TABLE)[:32]
+        signed = dict(params, wts=int(time.time()))
+        signed = {k: "".join(ch for ch in str(v) if ch not in "!'()*") for k, v in sorted(signed.items())}
+        query = urllib.parse.urlencode(signed)
+        signed["w_rid"] = hashlib.md5((query + self._mixin_key).encode()).hexdigest()
+        return signed
+
+    def _nav_keys(self) -> tuple[str, str]:
+        # the nav endpoint answers code -101 when logged out, but still carries the keys
+        request = urllib.request.Request(f"{self.base}/x/web-interface/nav", headers=self.headers)
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                images = (json.load(response).get("data") or {}).get("wbi_img") or {}
+        except (OSError, ValueError) as e:
+            raise SyncError(f"/x/web-interface/nav: {e}") from e
+
+        def stem(url):
+            return os.path.splitext(url.rsplit("/", 1)[-1])[0]
+
+        if not images.get("img_url") or not images.get("sub_url"):
+            raise SyncError("/x/web-interface/nav: no signing keys")
+        return stem(images["img_url"]), stem(images["sub_url"])
+
+
+def iter_collection(client: BiliClient, kind: str, owner: str, list_id: str):
+    """Yield {"bvid", "title", "time"} newest first, fetching pages as they are consumed."""
+    page = 1
+    while True:
+        try:
+            if kind == "space":
+                data = client.get("/x/space/wbi/arc/search", {
+                    "mid": list_id, "pn": page, "ps": PAGE_SIZE, "order": "pubdate",
+                })
+                rows = data.get("list", {}).get("vlist") or []
+                items = [(v["bvid"], v.get("title", ""), v.get("created", 0)) for v in rows]
+                more = page * PAGE_SIZE < data.get("page", {}).get("count", 0)
+            elif kind == "favorites":
+                data = client.get("/x/v3/fav/resource/list", {
+                    "media_id": list_id, "pn": page, "ps": 20, "order": "mtime", "platform": "web",
+                })
+                rows = data.get("medias") or []
+                # type 2 is a video; deleted ones keep their slot with an empty bvid
+                items = [(m["bvid"], m.get("title", ""), m.get("fav_time", 0))
+                         for m in rows if m.get("type") == 2 and m.get("bvid")]
+                more = bool(data.get("has_more"))
+            elif kind == "series":
+                data = client.get("/x/series/archives", {
+                    "mid": owner, "series_id": list_id, "pn": page, "ps": PAGE_SIZE, "sort": "desc",
+                })
+                rows = data.get("archives") or []
+                items = [(a["bvid"], a.get("title", ""), a.get("pubdate", 0)) for a in rows]
+                more = page * PAGE_SIZE < data.get("page", {}).get("total", 0)
+            else:
+                data = client.get("/x/polymer/web-space/seasons_archives_list", {
+                    "mid": owner, "season_id": list_id, "page_num": page, "page_size": PAGE_SIZE,
+                    "sort_reverse": "true",
+                })
+                rows = data.get("archives") or []
+                items = [(a["bvid"], a.get("title", ""), a.get("pubdate", 0)) for a in rows]
+                more = page * PAGE_SIZE < data.get("page", {}).get("total", 0)
+            videos = [{"bvid": bvid, "title": title, "time": int(stamp)} for bvid, title, stamp in items]
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            # a field missing, or not of the type the API documents
+            raise SyncError(f"Unexpected {kind} listing: {e!r}") from e
+
+        yield from videos
+
+        if not rows or not more:
+            return
+        page += 1
+        time.sleep(PAGE_DELAY)
+
+
+# ============================================================
+# High-water marks
+# ============================================================
+
+class CollectionSync:
+    """Per-collection high-water marks, persisted as JSON."""
+
+    def __init__(self, state_path: str, client: BiliClient | None = None, initial_limit: int = 0):
+        self.state_path = state_path
+        self.client = client or BiliClient()
+        # videos taken from a collection synced for the first time; 0 = all
+        self.initial_limit = initial_limit
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _load(self) -> dict:
+        if self._state is None:
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    self._state = json.load(f)
+            except (OSError, ValueError):
+                self._state = {}
+        return self._state
+
+    def _save(self):
+        try:
+            write_atomic(self.state_path, json.dumps(self._state, ensure_ascii=False, indent=2))
+        except OSError as e:
+            print("Failed to save sync state:", e)
+
+    def new_videos(self, url: str, full: bool = False) -> list[dict]:
+        """Videos of collection ``url`` newer than its mark, oldest first.
+
+        Videos still pending from earlier syncs are included. ``full``
+        ignores the mark (and the first-sync limit). The mark is not
+        moved; call commit() once the videos are queued.
+        """
+        kind, owner, list_id = parse_collection_url(url)
+        with self._lock:
+            entry = self._load().get(f"{kind}:{list_id}")
+            pending = list(entry.get("pending", [])) if entry else []
+        mark = 0 if full or not entry else entry["mark"]
+        seen_at_mark = set() if full or not entry else set(entry["seen"])
+        limit = 0 if full or entry else self.initial_limit
+
+        videos, queued = [], set()
+        for item in iter_collection(self.client, kind, owner, list_id):
+            if item["time"] < mark:
+                # newest first: everything from here on was synced before
+                break
+            if item["time"] == mark and item["bvid"] in seen_at_mark:
+                continue
+            # a video published while we paginate shifts the pages by one
+            if item["bvid"] not in queued:
+                queued.add(item["bvid"])
+                videos.append(item)
+            if limit and len(videos) >= limit:
+                break
+        videos += [video for video in pending if video["bvid"] not in queued]
+        videos.sort(key=lambda video: video["time"])
+        return videos
+
+    def commit(self, url: str, videos: list[dict]):
+        """Move ``url``'s mark up to the newest of ``videos``, which become pending."""
+        kind, _, list_id = parse_collection_url(url)
+        key = f"{kind}:{list_id}"
+        with self._lock:
+            state = self._load()
+            entry = state.get(key) or {"url": url, "mark": 0, "seen": []}
+            pending = {video["bvid"]: video for video in entry.get("pending", [])}
+            for video in videos:
+                if video["time"] > entry["mark"]:
+                    entry["mark"], entry["seen"] = video["time"], [video["bvid"]]
+                elif video["time"] == entry["mark"] and video["bvid"] not in entry["seen"]:
+                    entry["seen"].append(video["bvid"])
+                pending[video["bvid"]] = video
+            entry["pending"] = list(pending.values())
+            entry["synced_at"] = time.time()
+            state[key] = entry
+            self._save()
+
+    def done(self, url: str, bvid: str):
+        """``bvid`` of collection ``url`` is downloaded: stop offering it."""
+        kind, _, list_id = parse_collection_url(url)
+        with self._lock:
+            entry = self._load().get(f"{kind}:{list_id}")
+            if not entry or not any(video["bvid"] == bvid for video in entry.get("pending", [])):
+                return
+            entry["pending"] = [video for video in entry["pending"] if video["bvid"] != bvid]
+            self._save()
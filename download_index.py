@@ -0,0 +1,193 @@
+"""On-disk index of finished downloads.
+
+Keyed by (video id, page, quality, mode) so re-queuing a link only asks
+BBDown for the pages that are still missing.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+MEDIA_EXTS = (".mp4", ".m4a", ".mp3", ".flv", ".mkv", ".aac", ".opus")
+
+VIDEO_ID_RE = re.compile(r"(BV[0-9A-Za-z]{10})|(av\d+)|(ep\d+)|(ss\d+)", re.IGNORECASE)
+PAGE_TAG_RE = re.compile(r"\[P0*(\d+)\]")
+
+# file timestamps are coarser than time.time() (2 s on FAT)
+MTIME_SLACK = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    video_id     TEXT    NOT NULL,
+    page         INTEGER NOT NULL,
+    quality      TEXT    NOT NULL,
+    mode         TEXT    NOT NULL,
+    output_path  TEXT    NOT NULL DEFAULT '',
+    size         INTEGER NOT NULL DEFAULT 0,
+    completed_at REAL    NOT NULL,
+    PRIMARY KEY (video_id, quality, mode, page)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    pages    INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+# ============================================================
+# Helpers
+# ============================================================
+
+def video_id_from_url(url: str) -> str:
+    m = VIDEO_ID_RE.search(url)
+    if not m:
+        return url.split("?")[0].rstrip("/")
+    vid = m.group(0)
+    # BV ids are case-sensitive after the prefix; the others are not
+    return "BV" + vid[2:] if m.group(1) else vid.lower()
+
+
+def parse_page_spec(spec: str) -> list[int] | None:
+    """"1,3-5" → [1, 3, 4, 5]; None for specs that need the page list (ALL, LAST...)."""
+    pages = []
+    for item in spec.replace(" ", "").split(","):
+        m = re.fullmatch(r"(\d+)(?:-(\d+))?", item)
+        if not m:
+            return None
+        first = int(m.group(1))
+        last = int(m.group(2) or first)
+        pages += range(first, last + 1)
+    return sorted(set(pages)) or None
+
+
+def format_page_ranges(pages: list[int]) -> str:
+    """[1, 2, 3, 5] → "1-3,5", the form --select-page takes."""
+    ranges = []
+    for page in sorted(pages):
+        if ranges and page == ranges[-1][1] + 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def find_outputs(work_dir: str, since: float, pages: list[int], temp_dir: str = "") -> dict[int, tuple[str, int]]:
+    """Match media files written under ``work_dir`` after ``since`` to pages.
+
+    BBDown tags multi-part files with "[P01]"; a single-part job owns the
+    one new file it produced. Unmatched pages are left out. ``temp_dir``
+    names BBDown's temp folder in ``work_dir`` (the video's aid), whose
+    tracks and segments are not outputs.
+    """
+    found = []
+    base_depth = work_dir.rstrip(os.sep).count(os.sep)
+    for dirpath, dirnames, names in os.walk(work_dir):
+        if dirpath.count(os.sep) - base_depth >= 1:
+            dirnames[:] = []
+        else:
+            dirnames[:] = [d for d in dirnames if d != temp_dir]
+        for name in names:
+            if not name.lower().endswith(MEDIA_EXTS):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_mtime >= since - MTIME_SLACK:
+                found.append((name, path, st.st_size))
+
+    outputs = {}
+    for name, path, size in found:
+        m = PAGE_TAG_RE.search(name)
+        if m and int(m.group(1)) in pages:
+            outputs[int(m.group(1))] = (path, size)
+
+    if len(pages) == 1 and not outputs and len(found) == 1:
+        outputs[pages[0]] = found[0][1:]
+    return outputs
+
+
+# ============================================================
+# Index
+# ============================================================
+
+class DownloadIndex:
+    """SQLite-backed record of completed pages; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def completed_pages(self, video_id: str, quality: str, mode: str) -> set[int]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT page FROM downloads WHERE video_id = ? AND quality = ? AND mode = ?",
+                (video_id, quality, mode),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def page_count(self, video_id: str) -> int | None:
+        with self._lock:
+            row = self._db.execute("SELECT pages FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_page_count(self, video_id: str, pages: int):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO videos (video_id, pages) VALUES (?, ?)",
+                (video_id, pages),
+            )
+
+    def missing_pages(self, video_id: str, quality: str, mode: str, requested: list[int] | None) -> list[int] | None:
+        """Pages of ``requested`` not yet downloaded.
+
+        ``requested=None`` means every page; that can only be narrowed once
+        the page count is known, otherwise None is returned.
+        """
+        if requested is None:
+            total = self.page_count(video_id)
+            if not total:
+                return None
+            requested = list(range(1, total + 1))
+
+        done = self.completed_pages(video_id, quality, mode)
+        return [page for page in requested if page not in done]
+
+    def record(self, video_id: str, quality: str, mode: str, pages: list[int],
+               outputs: dict[int, tuple[str, int]] | None = None, page_count: int = 0):
+        outputs = outputs or {}
+        now = time.time()
+        rows = [
+            (video_id, page, quality, mode, *outputs.get(page, ("", 0)), now)
+            for page in pages
+        ]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO downloads "
+                    "(video_id, page, quality, mode, output_path, size, completed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                if page_count:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO videos (video_id, pages) VALUES (?, ?)",
+                        (video_id, page_count),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
@@ -0,0 +1,184 @@
+"""Pick the fastest Bilibili CDN (upos) host for BBDown's --upos-host.
+
+Every candidate is probed for connect latency, time to first byte and
+the throughput of a short ranged GET. The ranking is cached on disk for ``ttl`` seconds.
+While jobs run, each one reports how its host did: a failed run, or a
+speed far below that host's own running average, benches the host for a
+while so later jobs and retries use the next one.
+"""
+
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from staging import write_atomic
+
+DEFAULT_UPOS_HOSTS = [
+    "upos-sz-mirrorcos.bilivideo.com",
+    "upos-sz-mirrorali.bilivideo.com",
+    "upos-sz-mirrorhw.bilivideo.com",
+    "upos-sz-mirrorks3.bilivideo.com",
+]
+DEFAULT_PROBE_TTL = 3600
+DEFAULT_PROBE_BYTES = 256 * 1024
+DEFAULT_PROBE_TIMEOUT = 3.0
+
+# a job slower than this share of its host's running average degrades the host
+DEGRADE_RATIO = 0.3
+# weight of the newest job in a host's running average speed
+SPEED_EWMA = 0.3
+# how long a degraded host is passed over
+DEGRADE_SECONDS = 600
+
+PROBE_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Referer": "https://www.bilibili.com/",
+}
+
+
+def split_host(candidate: str, default_scheme: str = "https") -> tuple[str, str, int | None]:
+    """"host", "host:port" or "http://host:port" → (scheme, host, port)."""
+    parts = urlsplit(candidate if "://" in candidate else f"{default_scheme}://{candidate}")
+    return parts.scheme, parts.hostname or "", parts.port
+
+
+def host_arg(candidate: str) -> str:
+    """What BBDown's --upos-host takes: the host, with a port if one is given."""
+    _, host, port = split_host(candidate)
+    return f"{host}:{port}" if port else host
+
+
+def probe_host(candidate: str, path: str = "/", size: int = DEFAULT_PROBE_BYTES,
+               timeout: float = DEFAULT_PROBE_TIMEOUT, default_scheme: str = "https") -> dict | None:
+    """Latency and short-transfer throughput of one host; None if unreachable.
+
+    Only a 2xx answer (206 for the range) is timed as a transfer: an error
+    page says nothing about how fast the host serves video, so the host is
+    then scored on latency and time to first byte alone, and ranked after
+    the hosts that did serve the object.
+    """
+    scheme, host, port = split_host(candidate, default_scheme)
+    conn_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+    conn = conn_class(host, port, timeout=timeout)
+    try:
+        started = time.perf_counter()
+        conn.connect()
+        latency = time.perf_counter() - started
+
+        conn.request("GET", path, headers={**PROBE_HEADERS, "Range": f"bytes=0-{size - 1}"})
+        response = conn.getresponse()
+        sent = time.perf_counter()
+        ttfb = sent - started - latency
+        received = 0
+        while 200 <= response.status < 300 and received < size:
+            chunk = response.read(min(65536, size - received))
+            if not chunk:
+                break
+            received += len(chunk)
+        elapsed = time.perf_counter() - sent
+    except (OSError, http.client.HTTPException):
+        return None
+    finally:
+        conn.close()
+
+    throughput = received / elapsed if received and elapsed > 0 else 0.0
+    if not 200 <= response.status < 300:
+        score = latency + ttfb
+    else:
+        # estimated time to fetch ``size`` bytes; a host that sent nothing ranks on latency
+        score = latency + ttfb + (size / throughput if throughput else elapsed)
+    return {
+        "host": candidate,
+        "status": response.status,
+        "latency": round(latency, 4),
+        "ttfb": round(ttfb, 4),
+        "throughput": round(throughput),
+        "score": round(score, 4),
+    }
+
+
+class HostSelector:
+    """Ranked upos hosts with a TTL'd on-disk cache and mid-session fallback."""
+
+    def __init__(self, hosts: list[str], path: str, ttl: float = DEFAULT_PROBE_TTL,
+                 probe_path: str = "/", probe_bytes: int = DEFAULT_PROBE_BYTES,
+                 timeout: float = DEFAULT_PROBE_TIMEOUT, default_scheme: str = "https"):
+        self.hosts = list(hosts)
+        self.path = path
+        self.ttl = ttl
+        self.probe_path = probe_path
+        self.probe_bytes = probe_bytes
+        self.timeout = timeout
+        self.default_scheme = default_scheme
+        self._lock = threading.Lock()
+        self._ranking: list[dict] | None = None
+        self._measured_at = 0.0
+        # host → time until which it is passed over
+        self._degraded: dict[str, float] = {}
+        # host → running average job speed (bytes/s)
+        self._speeds: dict[str, float] = {}
+
+    def ranking(self, refresh: bool = False) -> list[dict]:
+        """Reachable hosts, fastest first; probes when the cache is stale."""
+        with self._lock:
+            if not refresh and self._ranking is None:
+                self._load()
+            if refresh or self._ranking is None or time.time() - self._measured_at >= self.ttl:
+                self._ranking = self._probe_all()
+                self._measured_at = time.time()
+                self._save()
+            return list(self._ranking)
+
+    def best(self) -> str | None:
+        """Fastest host not currently degraded; None leaves BBDown's default."""
+        ranking = self.ranking()
+        now = time.time()
+        with self._lock:
+            for entry in ranking:
+                if self._degraded.get(entry["host"], 0) <= now:
+                    return entry["host"]
+        return None
+
+    def report(self, host: str, ok: bool, speed: float = 0.0) -> bool:
+        """Feed back one job's outcome on ``host``; True if the host got benched."""
+        with self._lock:
+            average = self._speeds.get(host)
+            degraded = not ok or bool(speed and average and speed < DEGRADE_RATIO * average)
+            if speed:
+                self._speeds[host] = speed if average is None else average + SPEED_EWMA * (speed - average)
+            if degraded:
+                self._degraded[host] = time.time() + DEGRADE_SECONDS
+            return degraded
+
+    def _probe_all(self) -> list[dict]:
+        if not self.hosts:
+            return []
+        with ThreadPoolExecutor(max_workers=min(8, len(self.hosts))) as pool:
+            results = pool.map(
+                lambda host: probe_host(host, self.probe_path, self.probe_bytes, self.timeout, self.default_scheme),
+                self.hosts,
+            )
+            # a host that served the object beats one that answered with an error
+            return sorted((r for r in results if r), key=lambda r: (not 200 <= r["status"] < 300, r["score"]))
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # a cache made for another host list doesn't apply
+        if sorted(data.get("hosts", [])) == sorted(self.hosts):
+            self._ranking = data.get("ranking", [])
+            self._measured_at = data.get("measured_at", 0.0)
+
+    def _save(self):
+        try:
+            write_atomic(self.path, json.dumps(
+                {"hosts": self.hosts, "measured_at": self._measured_at, "ranking": self._ranking},
+            ))
+        except OSError as e:
+            print("Failed to save host cache:", e)
@@ -0,0 +1,218 @@
+"""Per-job timing metrics.
+
+Each job gets a JobMetrics that run_job_process feeds with the parsed
+progress events; a job retried by run_download keeps the same one, with
+an entry per tool run under "attempts". When the job ends its record
+goes to a JSON-lines file and, optionally, into a Prometheus
+textfile-collector file holding the running totals for this session.
+"""
+
+import json
+import threading
+import time
+
+from staging import write_atomic
+
+# parser stage → reported stage
+STAGE_GROUPS = {
+    "info": "api",
+    "parse": "api",
+    "video": "transfer",
+    "audio": "transfer",
+    "mux": "mux",
+    "encode": "convert",
+    "copy": "convert",
+    "skip": "convert",
+    "done": "finish",
+}
+REPORTED_STAGES = ("spawn", "api", "transfer", "mux", "convert", "finish", "other")
+
+# stage transitions kept per job; multi-page jobs repeat the same few
+MAX_TIMELINE = 400
+
+
+class JobMetrics:
+    """Stage timings, bytes and speeds of one job, over all its tool runs."""
+
+    def __init__(self, kind: str = "download"):
+        self.kind = kind
+        self.started = 0.0        # wall clock, for the record
+        self.finished = 0.0
+        self.returncode = None
+        # one entry per tool run: started, duration, returncode, bytes, avg_speed
+        self.attempts: list[dict] = []
+        self.stages = dict.fromkeys(REPORTED_STAGES, 0.0)
+        self.timeline: list[tuple[str, float]] = []
+        self.peak_speed = 0.0
+        self.media_seconds = 0.0
+        self._t0 = 0.0            # perf_counter at start
+        self._stage = "spawn"
+        self._stage_since = 0.0
+        # (stage, part) → most bytes seen in any run: redraws count once, and so
+        # does the part a retry's aria2c --continue reports as already there
+        self._bytes: dict[tuple[str, int], float] = {}
+        # bytes and transfer seconds before the current run
+        self._run_base = (0, 0.0)
+
+    def start(self):
+        """A tool run begins; runs after the first are the job's retries."""
+        now = time.perf_counter()
+        if not self.attempts:
+            self.started = time.time()
+            self._t0 = now
+        # the wait between runs counts towards no stage
+        self._stage, self._stage_since = "spawn", now
+        if len(self.timeline) < MAX_TIMELINE:
+            self.timeline.append(("spawn", round(now - self._t0, 3)))
+        self._run_base = (self.bytes, self.stages["transfer"])
+        self.attempts.append({"started": round(time.time(), 3)})
+
+    def first_output(self):
+        """The process printed its first line: spawning is over."""
+        if self._stage == "spawn":
+            self._enter("other")
+
+    def feed(self, event):
+        stage = STAGE_GROUPS.get(event.stage, "other")
+        if stage != self._stage:
+            self._enter(stage)
+        if event.unit == "B":
+            key = (event.stage, event.part)
+            if event.done > self._bytes.get(key, 0.0):
+                self._bytes[key] = event.done
+        elif event.unit == "s":
+            self.media_seconds = max(self.media_seconds, event.done)
+        self.peak_speed = max(self.peak_speed, event.speed)
+
+    def finish(self, returncode):
+        self._enter(None)
+        self.finished = time.time()
+        self.returncode = returncode
+        if self.attempts:
+            self.attempts[-1].update(
+                duration=round(self.finished - self.attempts[-1]["started"], 3),
+                returncode=returncode,
+                bytes=self.bytes - self._run_base[0],
+                avg_speed=round(self.run_speed),
+            )
+
+    def _enter(self, stage: str | None):
+        now = time.perf_counter()
+        self.stages[self._stage] += now - self._stage_since
+        self._stage_since = now
+        if stage is not None:
+            self._stage = stage
+            if len(self.timeline) < MAX_TIMELINE:
+                self.timeline.append((stage, round(now - self._t0, 3)))
+
+    @property
+    def bytes(self) -> int:
+        return int(sum(self._bytes.values()))
+
+    @property
+    def duration(self) -> float:
+        return max(self.finished - self.started, 0.0)
+
+    @property
+    def retries(self) -> int:
+        return max(len(self.attempts) - 1, 0)
+
+    @property
+    def avg_speed(self) -> float:
+        """Bytes per second over the transfer stage (or the whole job)."""
+        seconds = self.stages["transfer"] or self.duration
+        return self.bytes / seconds if seconds else 0.0
+
+    @property
+    def run_speed(self) -> float:
+        """Bytes per second over the transfer stage of the latest run."""
+        transferred = self.bytes - self._run_base[0]
+        seconds = self.stages["transfer"] - self._run_base[1]
+        if not seconds and self.attempts:
+            seconds = self.finished - self.attempts[-1]["started"]
+        return transferred / seconds if seconds > 0 else 0.0
+
+    def record(self, job) -> dict:
+        return {
+            "job": job.id,
+            "url": job.url,
+            "kind": self.kind,
+            "started": round(self.started, 3),
+            "finished": round(self.finished, 3),
+            "duration": round(self.duration, 3),
+            "returncode": self.returncode,
+            "retries": self.retries,
+            "attempts": self.attempts,
+            "stages": {name: round(sec, 3) for name, sec in self.stages.items() if sec},
+            "timeline": self.timeline,
+            "bytes": self.bytes,
+            "avg_speed": round(self.avg_speed),
+            "peak_speed": round(self.peak_speed, 2),
+            "media_seconds": round(self.media_seconds, 3),
+        }
+
+
+class MetricsWriter:
+    """Appends job records as JSON lines; keeps session totals for Prometheus."""
+
+    def __init__(self, path: str, prom_path: str = ""):
+        self.path = path
+        self.prom_path = prom_path
+        self._lock = threading.Lock()
+        # (kind, result) → jobs; (kind, stage) → seconds; kind → bytes / seconds / retries
+        self._jobs: dict[tuple[str, str], int] = {}
+        self._stage_seconds: dict[tuple[str, str], float] = {}
+        self._bytes: dict[str, int] = {}
+        self._duration: dict[str, float] = {}
+        self._retries: dict[str, int] = {}
+
+    def write(self, job, metrics: JobMetrics):
+        record = metrics.record(job)
+        kind = metrics.kind
+        result = "ok" if metrics.returncode == 0 else "failed"
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print("Failed to write job metrics:", e)
+
+            self._jobs[kind, result] = self._jobs.get((kind, result), 0) + 1
+            for stage, seconds in metrics.stages.items():
+                self._stage_seconds[kind, stage] = self._stage_seconds.get((kind, stage), 0.0) + seconds
+            self._bytes[kind] = self._bytes.get(kind, 0) + metrics.bytes
+            self._duration[kind] = self._duration.get(kind, 0.0) + metrics.duration
+            self._retries[kind] = self._retries.get(kind, 0) + metrics.retries
+
+            if self.prom_path:
+                self._write_prometheus()
+
+    def _write_prometheus(self):
+        lines = [
+            "# HELP bbdown_gui_jobs_total Jobs finished, by kind and result.",
+            "# TYPE bbdown_gui_jobs_total counter",
+        ]
+        lines += [
+            f'bbdown_gui_jobs_total{{kind="{kind}",result="{result}"}} {n}'
+            for (kind, result), n in sorted(self._jobs.items())
+        ]
+        lines += [
+            "# HELP bbdown_gui_stage_seconds_total Time spent per job stage.",
+            "# TYPE bbdown_gui_stage_seconds_total counter",
+        ]
+        lines += [
+            f'bbdown_gui_stage_seconds_total{{kind="{kind}",stage="{stage}"}} {sec:.3f}'
+            for (kind, stage), sec in sorted(self._stage_seconds.items())
+        ]
+        for name, help_text, values, fmt in (
+            ("bbdown_gui_bytes_total", "Bytes transferred.", self._bytes, "{}"),
+            ("bbdown_gui_job_seconds_total", "Wall time of finished jobs.", self._duration, "{:.3f}"),
+            ("bbdown_gui_retries_total", "Job retries.", self._retries, "{}"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f'{name}{{kind="{kind}"}} {fmt.format(v)}' for kind, v in sorted(values.items())]
+
+        try:
+            write_atomic(self.prom_path, "\n".join(lines) + "\n")
+        except OSError as e:
+            print("Failed to write Prometheus metrics:", e)
@@ -0,0 +1,268 @@
+"""Headless batch mode.
+
+Reads the GUI's config.json plus a list of URLs (one per line, from a
+file or stdin), runs them through BBDown with the same command builder
+the GUI uses, and prints progress as JSON lines on stdout. Space,
+favorites and series URLs stand for their videos added since the last
+sync, so a cron job can mirror them.
+
+Exit codes: 0 all jobs succeeded, 1 some job or collection sync failed,
+2 bad input.
+"""
+
+import argparse
+import json
+import sys
+import threading
+
+from bbdown_core import (
+    CONFIG_PATH,
+    AlreadyDownloaded,
+    CommandError,
+    Job,
+    JobDeferred,
+    JobScheduler,
+    build_command,
+    data_path,
+    ProgressParser,
+    load_settings,
+    open_collection_sync,
+    open_host_selector,
+    open_index,
+    open_metrics,
+    open_space_governor,
+    record_metrics,
+    requested_pages,
+    run_download,
+    run_job_process,
+    tool_paths,
+)
+from collection_sync import SyncError, parse_collection_url, video_url
+from download_index import format_page_ranges
+from video_info import INFO_CACHE_FILE, InfoCache, estimate_size
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+# ============================================================
+# Output
+# ============================================================
+
+_print_lock = threading.Lock()
+
+
+def emit(event: str, job: Job | None = None, **fields):
+    record = {"event": event}
+    if job is not None:
+        record["job"] = job.id
+        record["url"] = job.url
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False)
+    with _print_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def emit_progress(job: Job):
+    p = job.progress
+    if p is None:
+        return
+    emit(
+        "progress", job,
+        stage=p.stage, part=p.part, parts=p.parts,
+        done=p.done, total=p.total, unit=p.unit,
+        percent=round(p.percent, 1), speed=p.speed, eta=p.eta,
+    )
+
+
+def emit_metrics(job: Job):
+    if job.metrics is None:
+        return
+    record = job.metrics.record(job)
+    del record["job"], record["url"]
+    emit("metrics", job, **record)
+
+
+# ============================================================
+# Batch
+# ============================================================
+
+def read_urls(path: str) -> list[str]:
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+    return [
+        line.strip() for line in text.splitlines()
+        if line.strip() and not line.lstrip().startswith("#")
+    ]
+
+
+def expand_collections(urls: list[str], settings: dict, full: bool = False, config_path: str = CONFIG_PATH):
+    """Video URLs for ``urls``, the (collection URL, new videos) to commit, and the collections that failed."""
+    sync = open_collection_sync(settings, config_path)
+    expanded, synced, sync_failed = [], [], []
+    for url in urls:
+        if not parse_collection_url(url):
+            expanded.append(url)
+            continue
+        try:
+            videos = sync.new_videos(url, full=full)
+        except Exception as e:
+            # SyncError, or a bug: either way the other collections still run
+            message = str(e) if isinstance(e, SyncError) else repr(e)
+            emit("error", url=url, message=f"Sync failed: {message}")
+            sync_failed.append(url)
+            continue
+        emit("collection", url=url, new=len(videos))
+        expanded += [video_url(v["bvid"]) for v in videos]
+        synced.append((url, videos))
+    return expanded, sync, synced, sync_failed
+
+
+def run_batch(urls: list[str], settings: dict, max_jobs: int, verbose: bool = False, full_sync: bool = False,
+              config_path: str = CONFIG_PATH) -> int:
+    """Run ``urls``; state and caches are kept next to ``config_path``."""
+    tools = tool_paths(settings)
+    urls, sync, synced, sync_failed = expand_collections(urls, settings, full_sync, config_path)
+
+    index = open_index(settings, config_path) if settings.get("skip_downloaded") else None
+    metrics = open_metrics(settings, config_path)
+    hosts = open_host_selector(settings, config_path)
+    space = open_space_governor(settings)
+    info_cache = InfoCache(data_path(INFO_CACHE_FILE, config_path), float(settings.get("info_cache_ttl", 3600)))
+
+    # video URL → (collection URL, bvid), for videos that came from a sync
+    origins = {video_url(v["bvid"]): (url, v["bvid"]) for url, videos in synced for v in videos}
+
+    # build every command up front so a bad setting fails before anything runs
+    jobs = []
+    skipped = []
+    for i, url in enumerate(urls, 1):
+        try:
+            jobs.append(Job(i, url, build_command(settings, url, tools, index), settings))
+        except AlreadyDownloaded:
+            emit("skipped", url=url, reason="already downloaded")
+            skipped.append(url)
+    # every command built: the collections' marks can move past what is queued,
+    # each video pending until its job is done
+    for url, videos in synced:
+        sync.commit(url, videos)
+    for url in skipped:
+        if url in origins:
+            sync.done(*origins[url])
+
+    # job id → pages that retries couldn't fetch ("all" when never listed)
+    unrecovered: dict[int, str] = {}
+
+    def estimate(job: Job) -> int:
+        info = info_cache.fetch(job.url, tools["bbdown"])
+        return estimate_size(info, requested_pages(settings), "--audio-only" in job.cmd)
+
+    def run_job(job: Job) -> bool:
+        if space is not None and not space.settle(job, lambda: estimate(job)):
+            raise JobDeferred("Not enough free disk space.")
+        on_line = (lambda line: emit("log", job, line=line.rstrip("\r\n"))) if verbose else None
+
+        def run_once(job: Job):
+            parser = ProgressParser()
+            if job.upos_host:
+                emit("host", job, host=job.upos_host)
+            try:
+                run_job_process(job, emit_progress, on_line, parser=parser)
+            except OSError as e:
+                emit("error", job, message=f"Failed to start BBDown: {e}")
+                return None
+            return parser
+
+        def on_retry(job: Job, pages, delay: float):
+            emit(
+                "retry", job, attempt=job.retries, returncode=job.returncode, delay=round(delay, 1),
+                pages=format_page_ranges(pages) if pages else "all",
+            )
+
+        try:
+            failed = run_download(job, run_once, on_retry, index, hosts=hosts)
+        finally:
+            # one record per job, its retries included
+            emit_metrics(job)
+            record_metrics(metrics, job)
+        if job.work_dir != job.dest_dir:
+            emit("kept", job, path=job.work_dir)
+        if job.cancelled:
+            return False
+        if job.returncode != 0 or failed:
+            unrecovered[job.id] = format_page_ranges(failed) if failed else "all"
+            return False
+        return True
+
+    def on_change(job: Job):
+        if job.state == Job.DONE and job.url in origins:
+            sync.done(*origins[job.url])
+        if job.state == Job.WAITING:
+            emit(job.state, job, reason="disk space", needed=job.disk_needed)
+        else:
+            emit(job.state, job, returncode=job.returncode)
+
+    scheduler = JobScheduler(run_job, on_change, max_jobs, admit=space.admit if space else None)
+    for job in jobs:
+        emit("queued", job)
+        scheduler.submit(job)
+    try:
+        scheduler.wait()
+    except KeyboardInterrupt:
+        # BBDown runs in its own process group, so Ctrl+C doesn't reach it
+        for job in jobs:
+            scheduler.cancel(job, block=True)
+        scheduler.wait()
+        raise
+
+    failed = [job.id for job in jobs if job.state != Job.DONE]
+    emit(
+        "summary", total=len(jobs), done=len(jobs) - len(failed), skipped=len(skipped), failed=failed,
+        unrecovered={str(job_id): pages for job_id, pages in sorted(unrecovered.items())},
+        sync_failed=sync_failed,
+    )
+    return EXIT_FAILED if failed or sync_failed else EXIT_OK
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run BBDown jobs without the GUI.")
+    parser.add_argument("urls", nargs="?", default="-", help="file with one URL per line, or - for stdin (default)")
+    parser.add_argument("-c", "--config", default=CONFIG_PATH, help="config.json to read settings from")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="parallel BBDown processes (default: max_jobs from config)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="also emit every BBDown output line")
+    parser.add_argument("--full-sync", action="store_true", help="queue every video of a collection, not just those since the last sync")
+    args = parser.parse_args(argv)
+
+    settings = load_settings(args.config)
+
+    try:
+        urls = read_urls(args.urls)
+    except OSError as e:
+        emit("error", message=f"Failed to read URLs: {e}")
+        return EXIT_USAGE
+
+    if not urls:
+        emit("error", message="No URLs given.")
+        return EXIT_USAGE
+
+    max_jobs = max(1, args.jobs or int(settings.get("max_jobs", 1)))
+
+    try:
+        return run_batch(urls, settings, max_jobs, args.verbose, args.full_sync, args.config)
+    except CommandError as e:
+        emit("error", message=str(e))
+        return EXIT_USAGE
+    except KeyboardInterrupt:
+        emit("error", message="Interrupted.")
+        return EXIT_INTERRUPTED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,26 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+import zipfile
+
 from PyInstaller.utils.hooks import collect_submodules
 
 block_cipher = None
 
+# utils/ goes in as one archive; the app extracts it once to a per-user
+# cache (bbdown_core.bundled_utils_dir) and reuses it on later launches
+utils_zip = os.path.join(workpath, 'utils.zip')
+os.makedirs(workpath, exist_ok=True)
+with zipfile.ZipFile(utils_zip, 'w', zipfile.ZIP_DEFLATED) as zf:
+    for dirpath, dirnames, names in os.walk('utils'):
+        dirnames.sort()
+        for name in sorted(names):
+            path = os.path.join(dirpath, name)
+            zf.write(path, os.path.relpath(path, 'utils'))
+
 a = Analysis(
     ['main-gui.py'],
     pathex=[os.path.abspath('.')],
-    datas=[('utils', 'utils')],
+    datas=[(utils_zip, '.')],
     hiddenimports=collect_submodules('tkinterdnd2'),
     cipher=block_cipher,
 )
@@ -23,4 +36,4 @@ exe = EXE(
     name='BBDown-GUI',
     console=False,
     upx=False,
-)
\ No newline at end of file
+)
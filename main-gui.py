@@ -1,12 +1,78 @@
+import time
+
+# startup report baseline, taken before the heavier imports below
+_T_START = time.perf_counter()
+
 import os
 import sys
-import subprocess
+import json
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import filedialog, messagebox, ttk
 from tkinter.scrolledtext import ScrolledText
-from tkinterdnd2 import TkinterDnD, DND_FILES
-import re
-import json
+import queue
+import threading
+
+from bbdown_core import (
+    ARIA2C_PROFILES,
+    CONFIG_PATH,
+    DEFAULT_MAX_JOBS,
+    WATCH_STATE_FILE,
+    JOB_LOG_LINES,
+    AlreadyDownloaded,
+    CommandError,
+    Job,
+    JobDeferred,
+    JobScheduler,
+    ProgressEvent,
+    PartTracker,
+    ProgressParser,
+    attempt_pages,
+    build_command,
+    data_path,
+    expand_audio_paths,
+    finished_pages,
+    format_size,
+    load_settings,
+    metrics_summary,
+    open_collection_sync,
+    open_host_selector,
+    open_index,
+    open_metrics,
+    open_space_governor,
+    publish_outputs,
+    record_metrics,
+    requested_pages,
+    run_download,
+    run_job_process,
+    save_settings,
+    tool_paths,
+)
+from audio_convert import (
+    CONVERT_PRESETS,
+    CONVERT_PROFILES,
+    EncodeSpeed,
+    partial_path,
+    plan_conversion,
+    validate_output,
+)
+from collection_sync import SyncError, parse_collection_url, video_url
+from download_index import format_page_ranges, parse_page_spec, video_id_from_url
+from process_control import KILL_GRACE
+from staging import remove_stale_work_dirs
+from video_info import INFO_CACHE_FILE, InfoCache, estimate_size
+from watch_folder import FolderWatcher
+
+ENCODING_CANDIDATES = ["hevc", "av1", "avc"]
+QUALITY_CANDIDATES = [
+    "8K 超高清",
+    "4K 超清",
+    "1080P 高码率",
+    "1080P 60帧",
+    "1080P 高清",
+    "720P 高清",
+    "480P 清晰",
+    "360P 流畅",
+]
 
 TIPS_TEXT = """自制GUI, 不喜勿喷
 Based on:
@@ -14,22 +80,182 @@ Based on:
 (from Python) tkinter, tkinterdnd2
 
 Usage:
-- 输入视频链接, 选择模式, 点击“Process”
-- 将.m4a文件拖拽到下方区域
-  使其转换为mp3并删除原文件
+- 输入视频链接(每行一个, 或Import导入), 选择模式, 点击“Process”
+  “Audio → MP3”边下载边把完成的分P转换为mp3
+  “Fetch Info”预览首个链接的分P/清晰度, 供Advanced页选择
+  UP主空间/收藏夹/合集链接会展开为其中上次同步之后的新视频
+  Advanced页勾选“Use fastest CDN host”自动测速并选用最快的CDN节点
+  磁盘空间不足时任务显示为waiting, 空间足够后自动开始
+  任务按“Parallel”并发执行, 双击任务查看其日志
+  选中任务可Pause/Resume/Cancel, 取消时一并结束aria2c/ffmpeg并清理残留文件
+- 将.m4a文件或文件夹拖拽到下方区域
+  使其并行转换为mp3并删除原文件
+  选择“mp3-v0 + opus-128k”等组合时一次解码同时输出多种格式, 校验通过后才删除原文件
+- 勾选“Watch output folder”后, 新下载的.m4a会自动转换
 """
 
+# UI pump: how often the main loop drains worker output, and how long
+# a single drain may take before yielding back to Tk (one frame).
+UI_POLL_MS = 16
+UI_DRAIN_BUDGET = 0.012
+
+# log view: keep at most this many lines in the widget, trimming in steps
+LOG_MAX_LINES = 5000
+LOG_TRIM_SLACK = 500
+
+# drag-and-drop conversion pool
+CONVERT_WORKERS = os.cpu_count() or 2
+# seconds closing the window waits for jobs to stop and clean up their work folders
+CLOSE_WAIT = KILL_GRACE + 2.0
+
 
 # ============================================================
 # Helpers
 # ============================================================
 
-def resource_path(relative_path: str) -> str:
-    if getattr(sys, "frozen", False):
-        base_path = sys._MEIPASS  # type: ignore[attr-defined]
-    else:
-        base_path = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(base_path, relative_path)
+def _last_redraw(line: str) -> str:
+    pieces = [p for p in line.split("\r") if p]
+    return pieces[-1] if pieces else ""
+
+
+def _source_key(path: str) -> str:
+    # one spelling per file, however the path reached the converter
+    return os.path.normcase(os.path.abspath(path))
+
+
+# ============================================================
+# Log View
+# ============================================================
+
+class LogView:
+    """Bounded log widget backend.
+
+    Text is written in one insert per flush, carriage-return progress
+    redraws overwrite the current line, and the oldest lines are evicted
+    past ``max_lines``. The raw output can be mirrored to ``log_file``.
+    """
+
+    def __init__(self, widget: ScrolledText, max_lines: int = LOG_MAX_LINES, log_file: str = ""):
+        self.widget = widget
+        self.max_lines = max_lines
+        self._cr_pending = False
+        self._file = None
+        self.log_file = ""
+        self.set_log_file(log_file)
+
+    def set_log_file(self, path: str):
+        if path == self.log_file:
+            return
+        self.close()
+        self.log_file = path
+        if not path:
+            return
+        try:
+            self._file = open(path, "a", encoding="utf-8", newline="")
+        except OSError as e:
+            self.log_file = ""
+            print("Failed to open log file:", e)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def write(self, chunks: list[str]):
+        text = "".join(chunks)
+        if not text:
+            return
+
+        if self._file:
+            self._file.write(text)
+            self._file.flush()
+
+        self._render(text)
+        self._trim()
+        self.widget.see(tk.END)
+
+    def _render(self, text: str):
+        lines = text.replace("\r\n", "\n").split("\n")
+        head = lines[0]
+        tail = "".join("\n" + _last_redraw(line) for line in lines[1:])
+
+        if self._cr_pending or "\r" in head:
+            pieces = head.split("\r")
+            if not self._cr_pending:
+                self.widget.insert(tk.END, pieces.pop(0))
+            redraw = _last_redraw("\r".join(pieces))
+            if redraw:
+                self.widget.delete("end-1c linestart", "end-1c")
+                self.widget.insert(tk.END, redraw)
+            head = ""
+
+        if head or tail:
+            self.widget.insert(tk.END, head + tail)
+        self._cr_pending = lines[-1].endswith("\r")
+
+    def _trim(self):
+        if self.max_lines <= 0:
+            return
+        count = int(self.widget.index("end-1c").split(".")[0])
+        if count > self.max_lines + LOG_TRIM_SLACK:
+            self.widget.delete("1.0", f"{count - self.max_lines + 1}.0")
+
+
+# ============================================================
+# Conversion Stats
+# ============================================================
+
+class ConvertStats:
+    """Aggregate throughput of one batch of conversions."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.copied = 0
+        self.skipped = 0
+        self.audio_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    @property
+    def idle(self) -> bool:
+        return self.done + self.failed + self.cancelled >= self.total
+
+    def summary(self) -> str:
+        elapsed = max(time.perf_counter() - self.started, 1e-6)
+        text = (
+            f"Converted {self.done}/{self.total}"
+            f" | {self.done / elapsed:.2f} files/s"
+            f" | {self.audio_seconds / elapsed:.1f} audio-s/s"
+        )
+        if self.copied or self.skipped:
+            text += f" | {self.copied} copied, {self.skipped} skipped, ~{self.saved_seconds:.0f}s saved"
+        if self.failed:
+            text += f" | {self.failed} failed"
+        if self.cancelled:
+            text += f" | {self.cancelled} cancelled"
+        return text
+
+
+class _StageTimer:
+    """``with`` block that stores its duration under ``name``."""
+
+    def __init__(self, times: dict, name: str):
+        self.times = times
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.times[self.name] = time.perf_counter() - self.started
+        return False
 
 
 # ============================================================
@@ -38,21 +264,48 @@ def resource_path(relative_path: str) -> str:
 
 class BBDownGUI:
 
-    def __init__(self):
-        self.root = TkinterDnD.Tk()
+    def __init__(self, config_path: str = CONFIG_PATH):
+        # stage → seconds, shown in the log once startup has finished
+        self.startup_times = {"import": time.perf_counter() - _T_START}
+
+        # tkinterdnd2 is loaded into this root after the first paint
+        self.root = tk.Tk()
         self.root.title("BBDown GUI")
 
-        self.config_path = os.path.join(
-            os.path.dirname(os.path.abspath(__file__)),
-            "config.json"
-        )
+        self.config_path = config_path
+
+        # worker threads never touch Tk; they post text / callbacks here
+        self.ui_queue: queue.Queue = queue.Queue()
+
+        self.jobs: dict[int, Job] = {}
+        self._next_job_id = 1
+        self.scheduler = JobScheduler(self._run_job, self._on_job_changed)
+        self.convert_scheduler = JobScheduler(self._run_convert_job, self._on_job_changed, CONVERT_WORKERS)
+        self.convert_stats = ConvertStats()
+        # sources already handed to the converter by pipelined downloads
+        self._pipelined: set[str] = set()
+        # sources queued or being converted, from any route (UI thread only)
+        self._converting: set[str] = set()
+        # convert job id → (action, audio seconds, seconds saved), read once it finishes
+        self._convert_results: dict[int, tuple[str, float, float]] = {}
+        # job id → pages retries couldn't fetch, listed once downloads go idle
+        self._unrecovered: dict[int, str] = {}
+        # job id → (collection URL, bvid) of synced videos, pending until done
+        self._synced_jobs: dict[int, tuple[str, str]] = {}
+        self.encode_speed = EncodeSpeed()
 
         self._hide_console()
-        self._init_paths()
-        self._build_ui()
+        settings = load_settings(self.config_path)
+        self._init_state(settings)
+
+        with self._startup_stage("build_ui"):
+            self._build_ui()
+        with self._startup_stage("load_config"):
+            self.load_config(settings)
 
-        self.load_config()
         self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.root.after(UI_POLL_MS, self._drain_ui_queue)
+        self.root.after(0, self._after_first_paint, settings)
 
     def open_priority_editor(self, title, variable: tk.StringVar, candidates: list[str]):
         win = tk.Toplevel(self.root)
@@ -128,8 +381,8 @@ class BBDownGUI:
         tk.Button(bottom, text="OK", width=8, command=confirm).pack(side=tk.LEFT, padx=6)
         tk.Button(bottom, text="Cancel", width=8, command=win.destroy).pack(side=tk.LEFT)
 
-    def save_config(self):
-        data = {
+    def collect_settings(self) -> dict:
+        return {
             "download_mode": self.download_mode.get(),
             "page_type": self.choosed_page_type.get(),
             "page_value": self.page_input_mode_2.get(),
@@ -142,23 +395,29 @@ class BBDownGUI:
             "allow_pcdn": self.allow_pcdn.get(),
             "encoding_priority": self.encoding_priority.get(),
             "dfn_priority": self.dfn_priority.get(),
+            "log_max_lines": self.log_view.max_lines,
+            "log_file": self.log_view.log_file,
+            "max_jobs": self.scheduler.max_workers,
+            "aria2c_profile": self.aria2c_profile.get(),
+            "bandwidth_limit": self.bandwidth_limit.get(),
+            "skip_downloaded": self.skip_downloaded.get(),
+            "upos_select": self.upos_select.get(),
+            "scratch_dir": self.scratch_dir.get().strip(),
+            "convert_profile": self.convert_profile.get(),
+            "convert_allow_copy": self.convert_allow_copy.get(),
+            "convert_loudnorm": self.convert_loudnorm.get(),
+            "watch_enabled": self.watch_enabled.get(),
         }
 
+    def save_config(self):
         try:
-            with open(self.config_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            save_settings(self.collect_settings(), self.config_path)
         except Exception as e:
             print("Failed to save config:", e)
 
-    def load_config(self):
-        if not os.path.exists(self.config_path):
-            return
-
-        try:
-            with open(self.config_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception:
-            return
+    def load_config(self, data: dict | None = None):
+        if data is None:
+            data = load_settings(self.config_path)
 
         self.download_mode.set(data.get("download_mode", "video"))
 
@@ -179,10 +438,41 @@ class BBDownGUI:
         self.encoding_priority.set(data.get("encoding_priority", ""))
         self.dfn_priority.set(data.get("dfn_priority", ""))
 
+        self.aria2c_profile.set(data.get("aria2c_profile", "default"))
+        self.bandwidth_limit.set(data.get("bandwidth_limit", ""))
+        self.skip_downloaded.set(data.get("skip_downloaded", True))
+        self.upos_select.set(data.get("upos_select", False))
+        self.scratch_dir.set(data.get("scratch_dir", ""))
+        if data.get("convert_profile") in CONVERT_PROFILES or data.get("convert_profile") in CONVERT_PRESETS:
+            self.convert_profile.set(data["convert_profile"])
+        self.convert_allow_copy.set(data.get("convert_allow_copy", True))
+        self.convert_loudnorm.set(data.get("convert_loudnorm", False))
+        self.watch_enabled.set(data.get("watch_enabled", False))
+        self._on_watch_toggle()
+
+        self.log_view.max_lines = int(data.get("log_max_lines", LOG_MAX_LINES))
+        self.log_view.set_log_file(data.get("log_file", ""))
+
+        self.max_jobs.set(data.get("max_jobs", DEFAULT_MAX_JOBS))
+        self._on_max_jobs_changed()
+
         self._on_page_type_changed()
 
     def _on_close(self):
         self.save_config()
+        # children run in their own process groups and would outlive the window;
+        # the trees are killed side by side
+        for job in self.jobs.values():
+            if job.state not in Job.FINISHED:
+                self._scheduler_for(job).cancel(job)
+        if self.watcher:
+            self.watcher.stop()
+        # workers are daemon threads: let them remove their jobs' work folders
+        # before the process exits (what's left is swept at the next start)
+        deadline = time.monotonic() + CLOSE_WAIT
+        for scheduler in (self.scheduler, self.convert_scheduler):
+            scheduler.wait(max(0.0, deadline - time.monotonic()))
+        self.log_view.close()
         self.root.destroy()
 
     # --------------------------------------------------------
@@ -216,10 +506,107 @@ class BBDownGUI:
             except Exception:
                 pass
 
-    def _init_paths(self):
-        self.bbdown_path = resource_path("utils/BBDown/BBDown.exe")
-        self.ffmpeg_path = resource_path("utils/ffmpeg/bin/ffmpeg.exe")
-        self.aria2c_path = resource_path("utils/aria2/aria2c.exe")
+    def _init_state(self, settings: dict):
+        # binaries and the index are resolved by _init_paths after first paint
+        self.tools: dict[str, str] = {}
+        self.index = None
+        self.tools_ready = threading.Event()
+        self.info_cache = InfoCache(data_path(INFO_CACHE_FILE, self.config_path), float(settings["info_cache_ttl"]))
+        self.video_info = None
+        self.watch_dir = settings["watch_dir"] or os.getcwd()
+        self.watch_settle = float(settings["watch_settle_seconds"])
+        self.watcher = None
+        self.startup_report_file = settings["startup_report_file"]
+        self.metrics = open_metrics(settings, self.config_path)
+        # kept whatever upos_select says, so the checkbox can turn it on later
+        self.hosts = open_host_selector({**settings, "upos_select": True}, self.config_path)
+        # config.json keys the panels don't show (retries, probe list, ...) for new jobs
+        self.file_settings = settings
+        # disk-space admission for downloads
+        self.space = open_space_governor(settings)
+        self.collection_sync = open_collection_sync(settings, self.config_path)
+        self.scheduler.admit = self.space.admit if self.space else None
+        # resource governor: priorities per job kind, one ffmpeg thread budget
+        self.download_priority = settings["download_priority"]
+        self.convert_priority = settings["convert_priority"]
+        self.ffmpeg_threads = int(settings["ffmpeg_threads"]) or CONVERT_WORKERS
+        self.convert_scheduler.set_max_workers(min(CONVERT_WORKERS, self.ffmpeg_threads))
+
+    def _init_paths(self, settings: dict):
+        # worker thread: the onefile build may extract its bundled tools here
+        started = time.perf_counter()
+        self.tools = tool_paths(settings)
+        self.index = open_index(settings, self.config_path)
+        self.bbdown_path = self.tools["bbdown"]
+        self.ffmpeg_path = self.tools["ffmpeg"]
+        self.aria2c_path = self.tools["aria2c"]
+        self.tools_ready.set()
+        self.call_in_ui(self._on_tools_ready, time.perf_counter() - started)
+
+    # --------------------------------------------------------
+    # Deferred startup
+    # --------------------------------------------------------
+
+    def _startup_stage(self, name: str):
+        return _StageTimer(self.startup_times, name)
+
+    def _after_first_paint(self, settings: dict):
+        self.root.update_idletasks()
+        self.startup_times["first_paint"] = time.perf_counter() - _T_START
+        self._start_worker(self._init_paths, settings)
+        self._start_worker(self._remove_stale_work_dirs, settings)
+        self.root.after_idle(self._build_deferred_ui)
+
+    def _remove_stale_work_dirs(self, settings: dict):
+        # worker thread: job folders of a session that ended mid-download
+        for root in {os.getcwd(), settings["scratch_dir"] or os.getcwd()}:
+            for path in remove_stale_work_dirs(root):
+                self.log(f"Removed leftover work folder {path}\n")
+
+    def _build_deferred_ui(self):
+        with self._startup_stage("advanced_panel"):
+            self._build_advanced_settings(self.adv_frame)
+            self._on_delay_toggle()
+        with self._startup_stage("dnd"):
+            self._enable_dnd()
+
+    def _enable_dnd(self):
+        try:
+            from tkinterdnd2 import TkinterDnD, DND_FILES
+            TkinterDnD._require(self.root)
+        except (ImportError, RuntimeError, tk.TclError) as e:
+            self.drag_label.configure(text="Drag and drop unavailable (tkinterdnd2 failed to load)")
+            self.log(f"Drag and drop disabled: {e}\n")
+            return
+        self.drag_label.drop_target_register(DND_FILES) # type: ignore[attr-defined]
+        self.drag_label.dnd_bind("<<Drop>>", self.on_file_drop) # type: ignore[attr-defined]
+
+    def _on_tools_ready(self, elapsed: float):
+        times = self.startup_times
+        times["tools"] = elapsed
+        times["ready"] = time.perf_counter() - _T_START
+        self.log(
+            "Startup: "
+            + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in times.items())
+            + "\n"
+        )
+        if self.startup_report_file:
+            record = {
+                "time": time.time(),
+                "frozen": bool(getattr(sys, "frozen", False)),
+                **{name: round(seconds * 1000, 1) for name, seconds in times.items()},
+            }
+            try:
+                with open(self.startup_report_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                self.log(f"Failed to write startup report: {e}\n")
+
+    def _wait_for_tools(self) -> bool:
+        if self.tools_ready.is_set():
+            return True
+        messagebox.showinfo("Please wait", "Still preparing the bundled tools, try again in a moment.")
+        return False
 
     # --------------------------------------------------------
     # UI
@@ -234,6 +621,7 @@ class BBDownGUI:
 
         self._build_top(left_frame)
         self._build_actions(left_frame)
+        self._build_jobs(left_frame)
         self._build_log(left_frame)
         self._build_drag_area()
 
@@ -243,9 +631,13 @@ class BBDownGUI:
         frame = tk.Frame(parent)
         frame.pack(fill="x", padx=10, pady=8)
 
-        tk.Label(frame, text="Bilibili URL:").pack(anchor="w")
+        head = tk.Frame(frame)
+        head.pack(fill="x")
+        tk.Label(head, text="Bilibili URL(s), one per line:").pack(side=tk.LEFT)
+        tk.Button(head, text="Import...", command=self.import_urls).pack(side=tk.RIGHT)
+        tk.Button(head, text="Fetch Info", command=self.fetch_info).pack(side=tk.RIGHT, padx=4)
 
-        self.url_entry = tk.Entry(frame)
+        self.url_entry = tk.Text(frame, height=4, undo=True)
         self.url_entry.pack(fill="x", pady=4)
         self.make_text_context_menu(self.url_entry)
 
@@ -256,7 +648,12 @@ class BBDownGUI:
         frame.pack(fill="x", pady=4)
         self._build_download_mode(frame)
         self._build_page_chooser(frame)
-        self._build_advanced_settings(frame)
+
+        # the panel's widgets are filled in after first paint; its variables
+        # exist now so load_config can set them
+        self._init_advanced_vars()
+        self.adv_frame = tk.LabelFrame(frame, text="Advanced Settings")
+        self.adv_frame.pack(fill="x", pady=6)
 
     def _build_download_mode(self, parent):
         mode_frame = tk.LabelFrame(parent, text="Download Mode")
@@ -266,6 +663,7 @@ class BBDownGUI:
 
         tk.Radiobutton(mode_frame, text="Video", variable=self.download_mode, value="video").pack(side=tk.LEFT)
         tk.Radiobutton(mode_frame, text="Audio", variable=self.download_mode, value="audio").pack(side=tk.LEFT)
+        tk.Radiobutton(mode_frame, text="Audio → MP3", variable=self.download_mode, value="mp3").pack(side=tk.LEFT)
 
     # ---------------- PAGE CHOOSER ----------------
 
@@ -294,6 +692,8 @@ class BBDownGUI:
         self.page_input_mode_2.pack(side=tk.LEFT, padx=6)
         self.make_text_context_menu(self.page_input_mode_2)
 
+        tk.Button(adv_frame, text="Choose...", command=self.open_page_picker).pack(side=tk.LEFT, padx=(0, 6))
+
         tk.Label(adv_frame, text="e.g. 8 | 1-2 | 3-5 | ALL | LAST | LATEST", fg="gray").pack(side=tk.LEFT)
 
         self.page_input_mode_2.configure(state=tk.DISABLED)
@@ -301,12 +701,11 @@ class BBDownGUI:
     # ---------------- ADVANCED SETTINGS ----------------
 
     def _on_delay_toggle(self):
+        if self.delay_entry is None:
+            return
         self.delay_entry.configure(state=tk.NORMAL if self.delay_enabled.get() else tk.DISABLED)
 
-    def _build_advanced_settings(self, parent):
-        adv_frame = tk.LabelFrame(parent, text="Advanced Settings")
-        adv_frame.pack(fill="x", pady=6)
-
+    def _init_advanced_vars(self):
         # flags
         self.force_http = tk.BooleanVar(value=True)
         self.download_danmaku = tk.BooleanVar(value=False)
@@ -314,6 +713,30 @@ class BBDownGUI:
         self.audio_ascending = tk.BooleanVar(value=False)
         self.allow_pcdn = tk.BooleanVar(value=False)
 
+        # delay
+        self.delay_enabled = tk.BooleanVar(value=False)
+        self.delay_seconds = tk.StringVar(value="2")
+        self.delay_entry = None
+
+        # priorities (DEFAULT EMPTY)
+        self.encoding_priority = tk.StringVar(value="")
+        self.dfn_priority = tk.StringVar(value="")
+
+        # aria2c tuning
+        self.aria2c_profile = tk.StringVar(value="default")
+        self.bandwidth_limit = tk.StringVar(value="")
+
+        # download index
+        self.skip_downloaded = tk.BooleanVar(value=True)
+
+        # CDN host selection
+        self.upos_select = tk.BooleanVar(value=False)
+
+        # scratch work dir
+        self.scratch_dir = tk.StringVar(value="")
+
+    def _build_advanced_settings(self, adv_frame):
+        # flags
         tk.Checkbutton(adv_frame, text="Force HTTP (disable HTTPS)", variable=self.force_http).grid(row=0, column=0, columnspan=3, sticky="w")
         tk.Checkbutton(adv_frame, text="Download Danmaku", variable=self.download_danmaku).grid(row=1, column=0, columnspan=3, sticky="w")
         tk.Checkbutton(adv_frame, text="Video Ascending (smaller size first)", variable=self.video_ascending).grid(row=2, column=0, columnspan=3, sticky="w")
@@ -321,9 +744,6 @@ class BBDownGUI:
         tk.Checkbutton(adv_frame, text="Allow PCDN (fallback only)", variable=self.allow_pcdn).grid(row=4, column=0, columnspan=3, sticky="w")
 
         # delay
-        self.delay_enabled = tk.BooleanVar(value=False)
-        self.delay_seconds = tk.StringVar(value="2")
-
         tk.Checkbutton(adv_frame, text="Delay between parts (seconds)", variable=self.delay_enabled, command=self._on_delay_toggle).grid(row=5, column=0, sticky="w")
 
         self.delay_entry = tk.Entry(adv_frame, width=6, textvariable=self.delay_seconds)
@@ -331,11 +751,8 @@ class BBDownGUI:
         self.make_text_context_menu(self.delay_entry)
         tk.Label(adv_frame, text="sec", fg="gray").grid(row=5, column=2, sticky="w")
 
-        self.delay_entry.configure(state=tk.DISABLED)
-
         # encoding priority (DEFAULT EMPTY)
         tk.Label(adv_frame, text="Encoding Priority:").grid(row=6, column=0, sticky="w", pady=(8, 0))
-        self.encoding_priority = tk.StringVar(value="")
         self.encoding_entry = tk.Entry(adv_frame, textvariable=self.encoding_priority, width=32)
         self.encoding_entry.grid(row=7, column=0, columnspan=2, sticky="w", padx=6)
 
@@ -346,7 +763,7 @@ class BBDownGUI:
             command=lambda: self.open_priority_editor(
                 title="Encoding Priority",
                 variable=self.encoding_priority,
-                candidates=["hevc", "av1", "avc"]
+                candidates=self._info_candidates("encodings", ENCODING_CANDIDATES)
             )
         ).grid(row=7, column=2, sticky="w")
         self.make_text_context_menu(self.encoding_entry)
@@ -356,7 +773,6 @@ class BBDownGUI:
 
         # quality priority (DEFAULT EMPTY)
         tk.Label(adv_frame, text="Quality Priority:").grid(row=9, column=0, sticky="w", pady=(8, 0))
-        self.dfn_priority = tk.StringVar(value="")
         self.dfn_entry = tk.Entry(adv_frame, textvariable=self.dfn_priority, width=32)
         self.dfn_entry.grid(row=10, column=0, columnspan=2, sticky="w", padx=6)
 
@@ -367,28 +783,104 @@ class BBDownGUI:
             command=lambda: self.open_priority_editor(
                 title="Quality Priority",
                 variable=self.dfn_priority,
-                candidates=[
-                    "8K 超高清",
-                    "4K 超清",
-                    "1080P 高码率",
-                    "1080P 60帧",
-                    "1080P 高清",
-                    "720P 高清",
-                    "480P 清晰",
-                    "360P 流畅",
-                ]
+                candidates=self._info_candidates("qualities", QUALITY_CANDIDATES)
             )
         ).grid(row=10, column=2, sticky="w")
         self.make_text_context_menu(self.dfn_entry)
         tk.Label(adv_frame, text="e.g. 8K 超高清,1080P 高码率,HDR 真彩", fg="gray").grid(row=11, column=0, columnspan=3, sticky="w", padx=6)
 
+        # aria2c tuning
+        tk.Label(adv_frame, text="aria2c Profile:").grid(row=12, column=0, sticky="w", pady=(8, 0))
+        tk.OptionMenu(adv_frame, self.aria2c_profile, *ARIA2C_PROFILES).grid(row=12, column=1, columnspan=2, sticky="w", pady=(8, 0))
+
+        tk.Label(adv_frame, text="Total Bandwidth:").grid(row=13, column=0, sticky="w")
+        self.bandwidth_entry = tk.Entry(adv_frame, textvariable=self.bandwidth_limit, width=8)
+        self.bandwidth_entry.grid(row=13, column=1, sticky="w", padx=6)
+        self.make_text_context_menu(self.bandwidth_entry)
+        tk.Label(adv_frame, text="e.g. 8M, empty = unlimited; split across parallel jobs", fg="gray").grid(row=14, column=0, columnspan=3, sticky="w", padx=6)
+
+        # download index
+        tk.Checkbutton(adv_frame, text="Skip already downloaded pages", variable=self.skip_downloaded).grid(row=15, column=0, columnspan=3, sticky="w", pady=(8, 0))
+
+        # CDN host selection
+        tk.Checkbutton(adv_frame, text="Use fastest CDN host (probed)", variable=self.upos_select).grid(row=16, column=0, columnspan=3, sticky="w")
+
+        # scratch work dir
+        tk.Label(adv_frame, text="Scratch Folder:").grid(row=17, column=0, sticky="w", pady=(8, 0))
+        self.scratch_entry = tk.Entry(adv_frame, textvariable=self.scratch_dir, width=24)
+        self.scratch_entry.grid(row=17, column=1, sticky="w", padx=6, pady=(8, 0))
+        self.make_text_context_menu(self.scratch_entry)
+        tk.Button(adv_frame, text="...", width=3, command=self._choose_scratch_dir).grid(row=17, column=2, sticky="w", pady=(8, 0))
+        tk.Label(adv_frame, text="fast disk for BBDown's temp files; empty = output folder", fg="gray").grid(row=18, column=0, columnspan=3, sticky="w", padx=6)
+
+    def _choose_scratch_dir(self):
+        path = filedialog.askdirectory(title="Scratch folder", initialdir=self.scratch_dir.get() or os.getcwd())
+        if path:
+            self.scratch_dir.set(path)
+
     # ---------------- ACTIONS ----------------
 
     def _build_actions(self, parent):
         frame = tk.Frame(parent)
         frame.pack(pady=6)
 
-        tk.Button(frame, text="Process", font=("Segoe UI", 10, "bold"), command=self.process_url).pack()
+        self.process_btn = tk.Button(frame, text="Process", font=("Segoe UI", 10, "bold"), command=self.process_url)
+        self.process_btn.pack(side=tk.LEFT)
+
+        tk.Label(frame, text="Parallel:").pack(side=tk.LEFT, padx=(12, 2))
+        self.max_jobs = tk.IntVar(value=DEFAULT_MAX_JOBS)
+        tk.Spinbox(frame, from_=1, to=16, width=3, textvariable=self.max_jobs, command=self._on_max_jobs_changed).pack(side=tk.LEFT)
+
+        tk.Button(frame, text="Pause", command=self.pause_selected_jobs).pack(side=tk.LEFT, padx=(12, 0))
+        tk.Button(frame, text="Resume", command=self.resume_selected_jobs).pack(side=tk.LEFT, padx=(4, 0))
+        tk.Button(frame, text="Cancel", command=self.cancel_selected_jobs).pack(side=tk.LEFT, padx=(4, 0))
+        tk.Button(frame, text="Clear finished", command=self.clear_finished_jobs).pack(side=tk.LEFT, padx=(12, 0))
+
+    def _on_max_jobs_changed(self):
+        try:
+            self.scheduler.set_max_workers(int(self.max_jobs.get()))
+        except (tk.TclError, ValueError):
+            pass
+
+    def _build_jobs(self, parent):
+        frame = tk.Frame(parent)
+        frame.pack(fill="x", padx=10, pady=(0, 6))
+
+        columns = (
+            ("id", "#", 40),
+            ("state", "State", 60),
+            ("stage", "Stage", 90),
+            ("percent", "%", 45),
+            ("speed", "Speed", 80),
+            ("eta", "ETA", 60),
+            ("url", "URL / File", 0),
+        )
+
+        tree_frame = tk.Frame(frame)
+        tree_frame.pack(fill="x")
+
+        self.job_tree = ttk.Treeview(tree_frame, columns=[c[0] for c in columns], show="headings", height=5, selectmode="extended")
+        for name, text, width in columns:
+            self.job_tree.heading(name, text=text)
+            if width:
+                self.job_tree.column(name, width=width, stretch=False)
+        self.job_tree.pack(side=tk.LEFT, fill="x", expand=True)
+
+        scrollbar = tk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.job_tree.yview)
+        scrollbar.pack(side=tk.LEFT, fill="y")
+        self.job_tree.config(yscrollcommand=scrollbar.set)
+
+        self.job_tree.bind("<Double-1>", self._on_job_open)
+        self.job_tree.bind("<<TreeviewSelect>>", self._on_job_selected)
+
+        # progress of the selected job (or the latest active one)
+        bar_frame = tk.Frame(frame)
+        bar_frame.pack(fill="x", pady=(4, 0))
+        self.job_bar = ttk.Progressbar(bar_frame, maximum=100)
+        self.job_bar.pack(side=tk.LEFT, fill="x", expand=True)
+        self.job_bar_label = tk.Label(bar_frame, text="", fg="gray", width=36, anchor="w")
+        self.job_bar_label.pack(side=tk.LEFT, padx=(6, 0))
+        self._shown_job_id = None
 
     def _build_log(self, parent):
         frame = tk.Frame(parent)
@@ -396,14 +888,30 @@ class BBDownGUI:
         self.log_text = ScrolledText(frame, height=12)
         self.log_text.pack(fill="both", expand=True)
         self.log_text.bind("<Key>", lambda e: "break")
+        self.log_view = LogView(self.log_text)
 
     # ---------------- DND ----------------
 
     def _build_drag_area(self):
-        label = tk.Label(self.root, text="Drag and drop an .m4a file here", bg="#eaeaea", relief="groove", height=4)
-        label.pack(fill="x", padx=10, pady=(0, 10))
-        label.drop_target_register(DND_FILES) # type: ignore[attr-defined]
-        label.dnd_bind("<<Drop>>", self.on_file_drop) # type: ignore[attr-defined]
+        # registered as a drop target by _enable_dnd
+        self.drag_label = tk.Label(self.root, text="Drag and drop .m4a files or folders here", bg="#eaeaea", relief="groove", height=4)
+        self.drag_label.pack(fill="x", padx=10, pady=(0, 4))
+
+        bottom = tk.Frame(self.root)
+        bottom.pack(fill="x", padx=10, pady=(0, 6))
+
+        tk.Label(bottom, text="Convert to:").pack(side=tk.LEFT)
+        self.convert_profile = tk.StringVar(value="mp3-v0")
+        tk.OptionMenu(bottom, self.convert_profile, *CONVERT_PROFILES, *CONVERT_PRESETS).pack(side=tk.LEFT)
+        self.convert_allow_copy = tk.BooleanVar(value=True)
+        tk.Checkbutton(bottom, text="Copy stream when possible", variable=self.convert_allow_copy).pack(side=tk.LEFT, padx=(6, 0))
+        self.convert_loudnorm = tk.BooleanVar(value=False)
+        tk.Checkbutton(bottom, text="Normalize loudness", variable=self.convert_loudnorm).pack(side=tk.LEFT, padx=(6, 0))
+        self.watch_enabled = tk.BooleanVar(value=False)
+        tk.Checkbutton(bottom, text="Watch output folder", variable=self.watch_enabled, command=self._on_watch_toggle).pack(side=tk.LEFT, padx=(6, 0))
+
+        self.convert_status = tk.Label(bottom, text="", fg="gray", anchor="w")
+        self.convert_status.pack(side=tk.LEFT, fill="x", expand=True, padx=(10, 0))
 
     def _build_tips(self, parent):
         frame = tk.LabelFrame(parent, text="Tips", padx=8, pady=6)
@@ -416,120 +924,595 @@ class BBDownGUI:
     # --------------------------------------------------------
 
     def log(self, text: str):
-        self.log_text.insert(tk.END, text)
-        self.log_text.see(tk.END)
+        # safe to call from any thread
+        self.ui_queue.put(text)
 
-    def _process_make_cmd(self):
-        url = self.url_entry.get().strip()
-        if not url:
-            messagebox.showerror("Error", "Please enter a URL.")
+    def call_in_ui(self, func, *args):
+        self.ui_queue.put(lambda: func(*args))
+
+    def _drain_ui_queue(self):
+        deadline = time.perf_counter() + UI_DRAIN_BUDGET
+        pending = []
+
+        while time.perf_counter() < deadline:
+            try:
+                item = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if callable(item):
+                self._flush_log(pending)
+                pending = []
+                item()
+            else:
+                pending.append(item)
+
+        self._flush_log(pending)
+        self.root.after(UI_POLL_MS, self._drain_ui_queue)
+
+    def _flush_log(self, pending: list[str]):
+        if pending:
+            self.log_view.write(pending)
+
+    def _start_worker(self, target, *args):
+        worker = threading.Thread(target=target, args=args, daemon=True)
+        worker.start()
+        return worker
+
+    def _process_make_cmd(self, url: str, settings: dict | None = None):
+        try:
+            return build_command(settings or self.collect_settings(), url, self.tools, self.index)
+        except CommandError as e:
+            messagebox.showerror("Error", str(e))
             return None
 
-        url = url.split("?")[0]
-        self.log(f"Processing URL: {url}\n")
+    # ---------------- VIDEO INFO ----------------
 
-        cmd = [self.bbdown_path]
+    def fetch_info(self):
+        urls = self.url_entry.get("1.0", tk.END).split()
+        if not urls:
+            messagebox.showerror("Error", "Please enter a URL.")
+            return
 
-        if self.download_mode.get() == "audio":
-            cmd.append("--audio-only")
+        url = urls[0]
+        info = self.info_cache.get(url)
+        if info is not None:
+            self._on_info(url, info)
+            return
 
-        cmd += ["--use-aria2c", "--ffmpeg-path", self.ffmpeg_path, "--aria2c-path", self.aria2c_path]
+        self.log(f"Fetching info: {url}\n")
+        self._start_worker(self._fetch_info, url)
 
-        # page chooser
-        page_type = self.choosed_page_type.get()
-        if page_type == 1:
-            cmd += ["-p", "ALL"]
-        elif page_type == 2:
-            page = self.page_input_mode_2.get().strip()
-            if not page:
-                messagebox.showerror("Error", "Please enter the page(s).")
-                return None
-            cmd += ["--select-page", page]
+    def _fetch_info(self, url: str):
+        self.tools_ready.wait()
+        try:
+            info = self.info_cache.fetch(url, self.bbdown_path)
+        except Exception as e:
+            self.log(f"Fetch info failed: {e}\n")
+            return
+        self.call_in_ui(self._on_info, url, info)
+
+    def _on_info(self, url: str, info: dict):
+        self.video_info = info
+        if self.index and info["pages"]:
+            # lets "ALL" be narrowed to the missing pages before the first download
+            self.index.set_page_count(video_id_from_url(url), len(info["pages"]))
+        self.log(
+            f"Info: {info['title'] or url}\n"
+            f"  pages: {len(info['pages'])}\n"
+            f"  qualities: {', '.join(info['qualities']) or '-'}\n"
+            f"  encodings: {', '.join(info['encodings']) or '-'}\n"
+        )
 
-        # delay
-        if self.delay_enabled.get():
-            delay = self.delay_seconds.get().strip()
-            if not delay:
-                messagebox.showerror("Error", "Please enter delay seconds.")
-                return None
-            cmd += ["--delay-per-page", delay]
+    def _info_candidates(self, key: str, defaults: list[str]) -> list[str]:
+        # what the fetched video offers first, then the usual choices
+        found = self.video_info[key] if self.video_info else []
+        return found + [x for x in defaults if x not in found]
 
-        # flags
-        if self.force_http.get(): cmd.append("--force-http")
-        if self.download_danmaku.get(): cmd.append("--download-danmaku")
-        if self.video_ascending.get(): cmd.append("--video-ascending")
-        if self.audio_ascending.get(): cmd.append("--audio-ascending")
-        if self.allow_pcdn.get(): cmd.append("--allow-pcdn")
-
-        # encoding priority
-        encoding = self.encoding_priority.get().strip()
-        if encoding:
-            if not re.fullmatch(r"[a-zA-Z0-9,]+", encoding):
-                messagebox.showerror("Error", "Encoding format invalid. Example: hevc,av1,avc")
-                return None
-            cmd += ["--encoding-priority", encoding]
+    def open_page_picker(self):
+        if not self.video_info or not self.video_info["pages"]:
+            messagebox.showinfo("Pages", "Click \"Fetch Info\" first to load the page list.")
+            return
 
-        # quality priority
-        dfn = self.dfn_priority.get().strip()
-        if dfn:
-            cmd += ["--dfn-priority", dfn]
+        pages = self.video_info["pages"]
 
-        cmd.append(url)
-        return cmd
+        win = tk.Toplevel(self.root)
+        win.title("Choose Pages")
+        win.transient(self.root)
+        win.grab_set()
+
+        frame = tk.Frame(win, padx=10, pady=10)
+        frame.pack(fill="both", expand=True)
+
+        listbox = tk.Listbox(frame, width=60, height=16, selectmode=tk.EXTENDED)
+        listbox.pack(side=tk.LEFT, fill="both", expand=True)
+
+        scrollbar = tk.Scrollbar(frame, orient=tk.VERTICAL, command=listbox.yview)
+        scrollbar.pack(side=tk.LEFT, fill="y")
+        listbox.config(yscrollcommand=scrollbar.set)
+
+        current = parse_page_spec(self.page_input_mode_2.get()) or []
+        for i, p in enumerate(pages):
+            minutes, seconds = divmod(p["duration"], 60)
+            listbox.insert(tk.END, f"P{p['page']}  [{minutes}:{seconds:02d}]  {p['title']}")
+            if p["page"] in current:
+                listbox.select_set(i)
+
+        bottom = tk.Frame(win, pady=6)
+        bottom.pack()
+
+        def confirm():
+            selected = [pages[i]["page"] for i in listbox.curselection()]
+            if selected:
+                self.choosed_page_type.set(2)
+                self._on_page_type_changed()
+                self.page_input_mode_2.delete(0, tk.END)
+                self.page_input_mode_2.insert(0, format_page_ranges(selected))
+            win.destroy()
+
+        tk.Button(bottom, text="All", width=8, command=lambda: listbox.select_set(0, tk.END)).pack(side=tk.LEFT, padx=6)
+        tk.Button(bottom, text="OK", width=8, command=confirm).pack(side=tk.LEFT, padx=6)
+        tk.Button(bottom, text="Cancel", width=8, command=win.destroy).pack(side=tk.LEFT)
+
+    # ---------------- QUEUE ----------------
+
+    def import_urls(self):
+        path = filedialog.askopenfilename(
+            title="Import URLs",
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to read {path}:\n{e}")
+            return
+
+        if self.url_entry.get("1.0", "end-1c").strip():
+            self.url_entry.insert(tk.END, "\n")
+        self.url_entry.insert(tk.END, text.strip())
 
     def process_url(self):
+        self._on_max_jobs_changed()
         self.save_config()
-        cmd = self._process_make_cmd()
-        if not cmd:
+        urls = self.url_entry.get("1.0", tk.END).split()
+        if not urls:
+            messagebox.showerror("Error", "Please enter a URL.")
+            return
+        if not self._wait_for_tools():
             return
 
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform.startswith("win") else 0,
-        )
-        assert process.stdout is not None
-        for line in process.stdout:
-            self.log(line)
+        # commands are built now, so later setting changes don't affect queued jobs
+        settings = {**self.file_settings, **self.collect_settings()}
+        collections = [url for url in urls if parse_collection_url(url)]
+        if self._enqueue_urls([url for url in urls if url not in collections], settings) is None:
+            return
 
-        process.wait()
-        self.log("Download complete.\n")
+        self.url_entry.delete("1.0", tk.END)
+        if collections:
+            # listing a collection is network-bound; its videos are queued when it's done
+            self._start_worker(self._sync_collections, collections, settings)
 
-    # --------- M4A CONVERT ---------
+    def _enqueue_urls(self, urls: list[str], settings: dict) -> dict[str, Job | None] | None:
+        """Queue one job per video URL; url → job (None if already downloaded).
 
-    def process_file(self, file_path):
-        if not file_path.lower().endswith(".m4a"):
-            self.log("Only .m4a files are supported.\n")
+        Returns None, with nothing queued, if a command can't be built.
+        """
+        cmds = []
+        for url in urls:
+            try:
+                cmd = self._process_make_cmd(url, settings)
+            except AlreadyDownloaded:
+                self.log(f"Already downloaded, skipped: {url}\n")
+                cmds.append((url, None))
+                continue
+            if not cmd:
+                return None
+            cmds.append((url, cmd))
+
+        queued = {}
+        for url, cmd in cmds:
+            queued[url] = self.enqueue_job(url, cmd, settings=settings) if cmd else None
+        return queued
+
+    # ---------------- COLLECTIONS ----------------
+
+    def _sync_collections(self, urls: list[str], settings: dict):
+        # worker thread
+        for url in urls:
+            self.log(f"Syncing {url}\n")
+            try:
+                videos = self.collection_sync.new_videos(url)
+            except SyncError as e:
+                self.log(f"Sync failed: {e}\n")
+                continue
+            except Exception as e:
+                # a bug in one collection's sync shouldn't end the others' silently
+                self.log(f"Sync failed: {url}: {e!r}\n")
+                continue
+            self.log(f"{len(videos)} new video(s) in {url}\n")
+            if videos:
+                self.call_in_ui(self._enqueue_synced, url, videos, settings)
+
+    def _enqueue_synced(self, url: str, videos: list[dict], settings: dict):
+        queued = self._enqueue_urls([video_url(v["bvid"]) for v in videos], settings)
+        if queued is None:
+            return
+        # the mark moves past them now; each stays pending until its job is done
+        self.collection_sync.commit(url, videos)
+        for video in videos:
+            job = queued.get(video_url(video["bvid"]))
+            if job is None:
+                self.collection_sync.done(url, video["bvid"])
+            else:
+                self._synced_jobs[job.id] = (url, video["bvid"])
+
+    def _on_synced_job_finished(self, job: Job):
+        synced = self._synced_jobs.pop(job.id, None)
+        if synced and job.state == Job.DONE:
+            self.collection_sync.done(*synced)
+
+    def enqueue_job(self, url: str, cmd: list[str], scheduler: JobScheduler | None = None, settings: dict | None = None) -> Job:
+        job = Job(self._next_job_id, url, cmd, settings)
+        self._next_job_id += 1
+        self.jobs[job.id] = job
+        scheduler = scheduler or self.scheduler
+        if scheduler is self.convert_scheduler:
+            job.kind = "convert"
+
+        self.job_tree.insert("", tk.END, iid=str(job.id), values=(job.id, job.state, *job.progress_columns(), url))
+        self.log(f"[#{job.id}] Queued: {url}\n")
+        scheduler.submit(job)
+        return job
+
+    def _on_job_changed(self, job: Job):
+        self.call_in_ui(self._refresh_job_row, job)
+        if job.kind == "convert" and job.state in Job.FINISHED:
+            self.call_in_ui(self._converting.discard, _source_key(job.url))
+            # settled here, however the job ended: cancelled while queued it never runs
+            self.call_in_ui(self._on_convert_finished, job)
+        if job.kind == "download" and job.state in Job.FINISHED:
+            self.call_in_ui(self._on_synced_job_finished, job)
+            self.call_in_ui(self._report_unrecovered)
+
+    def _refresh_job_row(self, job: Job):
+        iid = str(job.id)
+        if not self.job_tree.exists(iid):
             return
 
-        output = file_path[:-4] + ".mp3"
-        self.log(f"Converting:\n{file_path}\n→ {output}\n")
+        stage, percent, speed, eta = job.progress_columns()
+        self.job_tree.item(iid, values=(job.id, job.state, stage, percent, speed, eta, job.url))
+
+        if not self.job_tree.selection() and job.state == Job.RUNNING:
+            self._shown_job_id = job.id
+        if self._shown_job_id == job.id:
+            self._refresh_job_bar(job)
+
+    def _refresh_job_bar(self, job: Job):
+        p = job.progress
+        self.job_bar.configure(value=p.percent if p else 0)
+        stage, percent, speed, eta = job.progress_columns()
+        text = " ".join(x for x in (f"#{job.id}", stage, percent, speed, eta and f"ETA {eta}") if x)
+        self.job_bar_label.configure(text=text)
+
+    def _on_job_selected(self, event):
+        selection = self.job_tree.selection()
+        job = self.jobs.get(int(selection[0])) if selection else None
+        if job:
+            self._shown_job_id = job.id
+            self._refresh_job_bar(job)
+
+    def clear_finished_jobs(self):
+        for job in list(self.jobs.values()):
+            if job.state in Job.FINISHED:
+                del self.jobs[job.id]
+                self.job_tree.delete(str(job.id))
+
+    def _selected_jobs(self) -> list[Job]:
+        return [self.jobs[int(iid)] for iid in self.job_tree.selection() if int(iid) in self.jobs]
+
+    def _scheduler_for(self, job: Job) -> JobScheduler:
+        return self.convert_scheduler if job.kind == "convert" else self.scheduler
+
+    def pause_selected_jobs(self):
+        for job in self._selected_jobs():
+            if self._scheduler_for(job).pause(job):
+                self.log(f"[#{job.id}] Paused.\n")
+
+    def resume_selected_jobs(self):
+        for job in self._selected_jobs():
+            if self._scheduler_for(job).resume(job):
+                self.log(f"[#{job.id}] Resumed.\n")
+
+    def cancel_selected_jobs(self):
+        for job in self._selected_jobs():
+            if self._scheduler_for(job).cancel(job):
+                self.log(f"[#{job.id}] Cancelling...\n")
+
+    def _on_job_open(self, event):
+        item = self.job_tree.identify_row(event.y)
+        job = self.jobs.get(int(item)) if item else None
+        if job is None:
+            return
 
-        process = subprocess.Popen(
-            [self.ffmpeg_path, "-i", file_path, "-q:a", "0", "-map", "a", output],
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            encoding="utf-8",
-            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform.startswith("win") else 0,
-        )
+        win = tk.Toplevel(self.root)
+        win.title(f"Job #{job.id} - {job.state}")
+
+        text = ScrolledText(win, height=24, width=100)
+        text.pack(fill="both", expand=True)
+        text.bind("<Key>", lambda e: "break")
+        self.make_text_context_menu(text)
+
+        view = LogView(text, max_lines=JOB_LOG_LINES)
+
+        def refresh():
+            text.delete("1.0", tk.END)
+            view.write(list(job.log))
+            win.title(f"Job #{job.id} - {job.state}")
+
+        tk.Button(win, text="Refresh", command=refresh).pack(pady=4)
+        refresh()
+
+    def _estimate_download(self, job: Job) -> int:
+        info = self.info_cache.fetch(job.url, self.bbdown_path)
+        return estimate_size(info, requested_pages(job.settings), "--audio-only" in job.cmd)
+
+    def _run_job(self, job: Job) -> bool:
+        if self.space is not None and not self.space.settle(job, lambda: self._estimate_download(job)):
+            self.log(f"[#{job.id}] Waiting for disk space (~{format_size(job.disk_needed)} needed).\n")
+            raise JobDeferred("Not enough free disk space.")
+        self.log(f"[#{job.id}] Started: {job.url}\n")
+
+        def on_line(line):
+            # progress redraws stay in the job's own log; the shared log is interleaved
+            if not line.endswith("\r"):
+                self.log(f"[#{job.id}] {line}")
+
+        # "download as MP3": convert each part while BBDown fetches the next
+        pipeline = job.settings.get("download_mode") == "mp3"
+        job.priority = self.download_priority
+
+        def run_once(job):
+            parser = ProgressParser()
+            tracker = PartTracker()
+            if job.upos_host:
+                self.log(f"[#{job.id}] CDN host: {job.upos_host}\n")
+
+            def on_progress(job):
+                self.on_job_progress(job)
+                if pipeline:
+                    finished = tracker.feed(job.progress)
+                    if finished:
+                        self._convert_parts(job, finished)
+
+            try:
+                run_job_process(job, on_progress, on_line, parser=parser)
+            except OSError as e:
+                self.log(f"[#{job.id}] Failed to start BBDown: {e}\n")
+                return None
 
-        assert process.stderr is not None
+            if pipeline and not job.cancelled:
+                # catch parts whose completion wasn't visible in the output; after a
+                # failed run, only those it finished (not one cut off while muxing)
+                self._convert_parts(job, finished_pages(job, parser, attempt_pages(job, parser)))
+            return parser
+
+        def on_retry(job, pages, delay):
+            which = f"pages {format_page_ranges(pages)}" if pages else "the whole job"
+            self.log(
+                f"[#{job.id}] BBDown exited with code {job.returncode}; retrying {which} "
+                f"in {delay:.0f}s (attempt {job.retries}/{job.settings.get('retry_attempts')}).\n"
+            )
 
-        for line in process.stderr:
-            self.log(line)
+        hosts = self.hosts if job.settings.get("upos_select") else None
+        try:
+            failed = run_download(job, run_once, on_retry, self.index, hosts=hosts)
+        finally:
+            # one record per job, its retries included
+            record_metrics(self.metrics, job)
+
+        if job.work_dir != job.dest_dir:
+            self.log(f"[#{job.id}] Some files could not be moved to the output folder; kept them in {job.work_dir}\n")
+        if job.cancelled:
+            self.log(f"[#{job.id}] Cancelled; partial files removed.\n")
+            return False
+
+        summary = metrics_summary(job.metrics) if job.metrics else ""
+        retried = f", {job.retries} retries" if job.retries else ""
+        if job.returncode == 0 and not failed:
+            self.log(f"[#{job.id}] Download complete ({summary}{retried}).\n")
+            return True
+
+        if failed:
+            self._unrecovered[job.id] = f"pages {format_page_ranges(failed)}"
+        elif failed is None:
+            self._unrecovered[job.id] = "all pages"
+        self.log(f"[#{job.id}] Download failed (exit code {job.returncode}, {summary}{retried}).\n")
+        return False
+
+    def _report_unrecovered(self):
+        # once no download is left running, list what retries couldn't fetch
+        if not self._unrecovered or any(
+            job.kind == "download" and job.state not in Job.FINISHED for job in self.jobs.values()
+        ):
+            return
+        lines = [f"  #{job_id} {self.jobs[job_id].url if job_id in self.jobs else ''}: {pages}"
+                 for job_id, pages in sorted(self._unrecovered.items())]
+        self.log("Pages that could not be downloaded after retries:\n" + "\n".join(lines) + "\n")
+        self._unrecovered.clear()
+
+    def _convert_parts(self, job: Job, parts: list[int]):
+        # parts leave the scratch folder first, so the converter works on the final copy
+        outputs = publish_outputs(job, parts)
+        for page, (path, _) in sorted(outputs.items()):
+            if not path.lower().endswith(".m4a") or path in self._pipelined:
+                continue
+            self._pipelined.add(path)
+            self.log(f"[#{job.id}] P{page} downloaded, converting.\n")
+            self.call_in_ui(self.process_file, path)
 
-        process.wait()
-        if process.returncode == 0:
-            os.remove(file_path)
-            self.log("Conversion done & source deleted.\n")
+    # --------- M4A CONVERT ---------
+
+    def process_file(self, file_path):
+        if not file_path.lower().endswith(".m4a"):
+            self.log(f"Only .m4a files are supported: {file_path}\n")
+            return None
+        # the pipeline, a drop and the folder watcher can all offer the same part
+        key = _source_key(file_path)
+        if key in self._converting:
+            self.log(f"Already converting, skipped: {file_path}\n")
+            return None
+        self._converting.add(key)
+
+        if self.convert_stats.idle:
+            self.convert_stats.reset()
+        self.convert_stats.total += 1
+
+        # the ffmpeg command is planned on the worker, after probing the file
+        settings = {
+            "convert_profile": self.convert_profile.get(),
+            "convert_allow_copy": self.convert_allow_copy.get(),
+            "convert_loudnorm": self.convert_loudnorm.get(),
+            "convert_tags": self.file_settings.get("convert_tags", True),
+        }
+        return self.enqueue_job(file_path, [], self.convert_scheduler, settings)
+
+    def _run_convert_job(self, job: Job) -> bool:
+        ok, *result = self._convert(job)
+        self._convert_results[job.id] = tuple(result)
+        return ok
+
+    def _convert(self, job: Job) -> tuple[bool, str, float, float]:
+        """Run one conversion; (ok, action, audio seconds, seconds saved)."""
+        # drops and the folder watcher can queue work before the tools are ready
+        self.tools_ready.wait()
+        job.priority = self.convert_priority
+        file_path = job.url
+        # the thread budget is split between the pool's slots
+        threads = max(1, self.ffmpeg_threads // job.concurrency)
+        plan = plan_conversion(
+            self.ffmpeg_path, self.tools["ffprobe"], file_path,
+            job.settings["convert_profile"], job.settings["convert_allow_copy"], threads,
+            job.settings["convert_loudnorm"], job.settings["convert_tags"],
+        )
+        duration = plan.duration
+
+        if plan.action == "skip":
+            saved = self.encode_speed.saved(plan, 0.0)
+            job.progress = ProgressEvent("skip", 0, 0, duration, duration, unit="s")
+            self.log(f"[#{job.id}] Up to date, skipped: {plan.output} (~{saved:.1f}s saved)\n")
+            return True, plan.action, 0.0, saved
+
+        job.cmd = plan.cmd
+        self.log(f"[#{job.id}] Converting ({plan.action}):\n{file_path}\n→ {plan.output}\n")
+
+        started = time.perf_counter()
+        parser = ProgressParser(stage=plan.action)
+        run_job_process(job, self.on_job_progress, encoding="utf-8", parser=parser)
+        elapsed = time.perf_counter() - started
+        record_metrics(self.metrics, job)
+
+        if job.cancelled:
+            # ffmpeg leaves truncated outputs; the source is kept
+            self._remove_partials(plan)
+            self.log(f"[#{job.id}] Conversion cancelled, partial output removed.\n")
+            return False, plan.action, 0.0, 0.0
+
+        duration = duration or parser.duration
+        # outputs get their real names, and the source goes, only once they read back whole
+        ok = job.returncode == 0 and self._validate_outputs(job, plan, duration)
+        saved = 0.0
+        if ok:
+            if plan.action == "encode":
+                self.encode_speed.add(duration, elapsed)
+            saved = self.encode_speed.saved(plan, elapsed)
+            job.progress = ProgressEvent(plan.action, 0, 0, duration, duration, unit="s")
+            note = f" (~{saved:.1f}s saved)" if saved else ""
+            try:
+                os.remove(file_path)
+                self.log(f"[#{job.id}] Conversion done & source deleted.{note}\n")
+            except OSError as e:
+                # the outputs are already in place; only the cleanup failed
+                self.log(f"[#{job.id}] Conversion done, but the source was kept ({e}).{note}\n")
+        elif job.returncode != 0:
+            self._remove_partials(plan)
+            self.log(f"[#{job.id}] Conversion failed (exit code {job.returncode}).\n")
+        return ok, plan.action, duration, saved
+
+    def _validate_outputs(self, job: Job, plan, duration: float) -> bool:
+        valid = True
+        for profile, path in plan.written:
+            partial = partial_path(path)
+            problem = validate_output(self.tools["ffprobe"], partial, profile, duration)
+            if not problem:
+                try:
+                    os.replace(partial, path)
+                    continue
+                except OSError as e:
+                    problem = f"rename failed: {e}"
+            self.log(f"[#{job.id}] Output failed validation ({problem}), source kept: {path}\n")
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            valid = False
+        return valid
+
+    @staticmethod
+    def _remove_partials(plan):
+        for _, path in plan.written:
+            try:
+                os.remove(partial_path(path))
+            except OSError:
+                pass
+
+    def on_job_progress(self, job: Job):
+        self.call_in_ui(self._refresh_job_row, job)
+
+    def _on_convert_finished(self, job: Job):
+        stats = self.convert_stats
+        action, duration, saved = self._convert_results.pop(job.id, ("", 0.0, 0.0))
+        if job.state == Job.DONE:
+            stats.done += 1
+            stats.audio_seconds += duration
+            stats.saved_seconds += saved
+            stats.copied += action == "copy"
+            stats.skipped += action == "skip"
+        elif job.state == Job.CANCELLED:
+            stats.cancelled += 1
+        else:
+            stats.failed += 1
+        self.convert_status.configure(text=stats.summary())
+
+    def _on_watch_toggle(self):
+        if self.watch_enabled.get():
+            if self.watcher is None:
+                self.watcher = FolderWatcher(
+                    self.watch_dir,
+                    lambda path: self.call_in_ui(self.process_file, path),
+                    data_path(WATCH_STATE_FILE, self.config_path),
+                    settle=self.watch_settle,
+                )
+            if not self.watcher.running:
+                self.watcher.start()
+                self.log(f"Watching for new .m4a files: {self.watch_dir}\n")
+        elif self.watcher and self.watcher.running:
+            self.watcher.stop()
+            self.log("Stopped watching.\n")
 
     def on_file_drop(self, event):
-        path = event.data.strip("{}")
-        self.process_file(path)
+        paths = self.root.tk.splitlist(event.data)
+        self._start_worker(self._expand_drop, paths)
+
+    def _expand_drop(self, paths):
+        self.call_in_ui(self._convert_files, expand_audio_paths(paths))
+
+    def _convert_files(self, files: list[str]):
+        for path in files:
+            self.process_file(path)
 
     # --------------------------------------------------------
     # Run
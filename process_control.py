@@ -0,0 +1,173 @@
+"""Process-tree control and scheduling priority for tool runs.
+
+BBDown starts aria2c and ffmpeg itself, so stopping a job means stopping
+the whole tree. On POSIX every job gets its own session, and the process
+group is signalled. On Windows, taskkill /T ends the tree and
+NtSuspendProcess / NtResumeProcess pause and resume each member.
+
+Priorities are named profiles. On POSIX they are applied through
+nice / ionice prefixes so descendants inherit them from the start; on
+Windows through the priority class, which children below normal inherit.
+"""
+
+import os
+import shutil
+import signal
+import subprocess
+import sys
+
+IS_WINDOWS = sys.platform.startswith("win")
+
+# seconds a tree gets to exit after the polite signal before it is killed
+KILL_GRACE = 3.0
+
+# name → nice level, ionice (class, level) or None, Windows priority class flag
+PRIORITY_PROFILES = {
+    "normal": {"nice": 0, "ionice": None, "windows": 0},
+    "low": {"nice": 10, "ionice": ("2", "7"), "windows": 0x00004000},   # BELOW_NORMAL_PRIORITY_CLASS
+    "idle": {"nice": 19, "ionice": ("3", None), "windows": 0x00000040},  # IDLE_PRIORITY_CLASS
+}
+
+
+def governed_command(cmd: list[str], priority: str = "normal") -> list[str]:
+    """``cmd`` wrapped in nice / ionice for ``priority`` (POSIX only)."""
+    profile = PRIORITY_PROFILES.get(priority, PRIORITY_PROFILES["normal"])
+    if IS_WINDOWS:
+        return cmd
+
+    prefix = []
+    if profile["ionice"] and sys.platform.startswith("linux") and shutil.which("ionice"):
+        io_class, io_level = profile["ionice"]
+        prefix += ["ionice", "-c", io_class] + (["-n", io_level] if io_level else [])
+    if profile["nice"] and shutil.which("nice"):
+        prefix += ["nice", "-n", str(profile["nice"])]
+    return prefix + cmd
+
+
+def popen_options(priority: str = "normal") -> dict:
+    """Popen keyword arguments that put the child in its own killable group."""
+    profile = PRIORITY_PROFILES.get(priority, PRIORITY_PROFILES["normal"])
+    if IS_WINDOWS:
+        flags = subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP | profile["windows"]
+        return {"creationflags": flags}
+    return {"start_new_session": True}
+
+
+# ============================================================
+# Tree control
+# ============================================================
+
+def kill_tree(process: subprocess.Popen, grace: float = KILL_GRACE):
+    """End ``process`` and everything it started."""
+    if IS_WINDOWS:
+        # /T takes the children; they die before the parent is reaped
+        subprocess.run(
+            ["taskkill", "/PID", str(process.pid), "/T", "/F"],
+            capture_output=True,
+            creationflags=subprocess.CREATE_NO_WINDOW,
+        )
+        return
+
+    _signal_group(process, signal.SIGTERM)
+    # a paused tree only sees SIGTERM once it runs again
+    _signal_group(process, signal.SIGCONT)
+    try:
+        process.wait(grace)
+    except subprocess.TimeoutExpired:
+        pass
+    # the leader may be gone while aria2c / ffmpeg linger in the group
+    _signal_group(process, signal.SIGKILL)
+
+
+def pid_alive(pid: int) -> bool:
+    """Whether a process with id ``pid`` is running."""
+    if IS_WINDOWS:
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        try:
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        finally:
+            kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        # signal 0 only checks the pid
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def suspend_tree(process: subprocess.Popen):
+    if IS_WINDOWS:
+        _windows_tree_call(process.pid, "NtSuspendProcess")
+    else:
+        _signal_group(process, signal.SIGSTOP)
+
+
+def resume_tree(process: subprocess.Popen):
+    if IS_WINDOWS:
+        _windows_tree_call(process.pid, "NtResumeProcess")
+    else:
+        _signal_group(process, signal.SIGCONT)
+
+
+def _signal_group(process: subprocess.Popen, sig):
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _windows_tree_call(pid: int, function: str):
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessEntry(ctypes.Structure):
+        _fields_ = [
+            ("dwSize", wintypes.DWORD),
+            ("cntUsage", wintypes.DWORD),
+            ("th32ProcessID", wintypes.DWORD),
+            ("th32DefaultHeapID", ctypes.c_size_t),
+            ("th32ModuleID", wintypes.DWORD),
+            ("cntThreads", wintypes.DWORD),
+            ("th32ParentProcessID", wintypes.DWORD),
+            ("pcPriClassBase", wintypes.LONG),
+            ("dwFlags", wintypes.DWORD),
+            ("szExeFile", ctypes.c_wchar * 260),
+        ]
+
+    kernel32 = ctypes.windll.kernel32
+    ntdll = ctypes.windll.ntdll
+    kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+
+    # parent → children, from one snapshot of all processes
+    children: dict[int, list[int]] = {}
+    snapshot = kernel32.CreateToolhelp32Snapshot(0x00000002, 0)  # TH32CS_SNAPPROCESS
+    entry = ProcessEntry()
+    entry.dwSize = ctypes.sizeof(entry)
+    try:
+        ok = kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+        while ok:
+            children.setdefault(entry.th32ParentProcessID, []).append(entry.th32ProcessID)
+            ok = kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+    finally:
+        kernel32.CloseHandle(snapshot)
+
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack += [c for c in children.get(current, []) if c not in tree]
+
+    for member in tree:
+        handle = kernel32.OpenProcess(0x0800, False, member)  # PROCESS_SUSPEND_RESUME
+        if handle:
+            getattr(ntdll, function)(handle)
+            kernel32.CloseHandle(handle)
@@ -0,0 +1,182 @@
+"""Scratch work directories and disk-space admission.
+
+BBDown writes its video and audio tracks and the muxed file into its
+work directory, a per-job folder: on a fast scratch disk when one is
+set, else inside the destination. Finished files then reach the
+destination through one rename, or one streaming copy when the scratch
+directory is on another filesystem.
+
+SpaceGovernor holds queued jobs back while the disks they write to
+lack room for the bytes they are expected to need. write_atomic is how
+the state and cache files are saved.
+"""
+
+import errno
+import os
+import shutil
+import threading
+
+from process_control import pid_alive
+
+# bytes copied per read when a move has to cross filesystems
+COPY_BUFFER = 1024 * 1024
+
+# each download's own work folder, under scratch_dir or the output folder
+JOB_DIR_PREFIX = ".bbdown-job-"
+# what a work folder is renamed to when files that couldn't be moved out are left in it
+KEPT_DIR_PREFIX = "bbdown-kept-"
+
+
+def existing_parent(path: str) -> str:
+    """``path`` or its nearest ancestor that exists."""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def free_bytes(path: str) -> int:
+    return shutil.disk_usage(existing_parent(path)).free
+
+
+def device_of(path: str) -> int:
+    return os.stat(existing_parent(path)).st_dev
+
+
+def move_file(src: str, dst: str) -> str:
+    """Move ``src`` to ``dst``: a rename on one filesystem, else a single copy.
+
+    A cross-filesystem copy goes to "<dst>.part" first, so the destination
+    never holds a half-written file under its real name.
+    """
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    try:
+        os.replace(src, dst)
+        return dst
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    tmp = dst + ".part"
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            shutil.copyfileobj(fin, fout, COPY_BUFFER)
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    os.remove(src)
+    return dst
+
+
+def remove_stale_work_dirs(root: str) -> list[str]:
+    """Remove the work folders in ``root`` whose process is gone; returns their paths.
+
+    A session that ended before its jobs did (killed, or closed mid-download)
+    leaves them behind, holding partial media and BBDown's temp folder.
+    """
+    removed = []
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return removed
+    for name in names:
+        # "<prefix><pid>-<job id>"
+        pid = name[len(JOB_DIR_PREFIX):].split("-", 1)[0]
+        if not name.startswith(JOB_DIR_PREFIX) or not pid.isdigit():
+            continue
+        if int(pid) == os.getpid() or pid_alive(int(pid)):
+            continue
+        path = os.path.join(root, name)
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path)
+    return removed
+
+
+def write_atomic(path: str, text: str):
+    """Write ``text`` to ``path`` through "<path>.tmp", so it is never left half-written.
+
+    Raises OSError; the caller decides how loudly a failed save is reported.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class SpaceGovernor:
+    """Admits a job only while its disks have room for what it will write.
+
+    Each job's ``disk_needed`` (None = not estimated yet) is weighed
+    against free space, less ``reserve`` and what the admitted, still
+    running jobs on the same filesystem have yet to write. While there is
+    more than ``margin`` to spare, jobs are taken to need ``margin``
+    rather than estimated (0 = always estimate).
+    """
+
+    def __init__(self, reserve: int = 0, margin: int = 0):
+        self.reserve = reserve
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._admitted: set = set()
+
+    def admit(self, job) -> bool:
+        with self._lock:
+            if self._headroom(job) < (job.disk_needed or 0):
+                self._admitted.discard(job)
+                return False
+            self._admitted.add(job)
+            return True
+
+    def settle(self, job, estimate) -> bool:
+        """Work out ``job``'s needs if still unknown, then admit it.
+
+        ``estimate()`` (which may run BBDown) is only called once free
+        space is within ``margin`` of the reserve.
+        """
+        if job.disk_needed is None and self.margin:
+            with self._lock:
+                if self._headroom(job) >= self.margin:
+                    job.disk_needed = self.margin
+        if job.disk_needed is None:
+            try:
+                job.disk_needed = int(estimate() or 0)
+            except Exception as e:
+                job.append_log(f"Couldn't estimate the download size: {e}\n")
+                job.disk_needed = 0
+        return self.admit(job)
+
+    def _headroom(self, job) -> float:
+        """Bytes ``job`` may write: the least any of its disks has to spare."""
+        self._admitted -= {j for j in self._admitted if j.state in j.FINISHED}
+        headroom = float("inf")
+        for path in job_dirs(job):
+            try:
+                device = device_of(path)
+                free = free_bytes(path)
+            except OSError:
+                continue
+            pending = sum(
+                self._remaining(other) for other in self._admitted
+                if other is not job and device in {device_of(p) for p in job_dirs(other)}
+            )
+            headroom = min(headroom, free - pending - self.reserve)
+        return headroom
+
+    @staticmethod
+    def _remaining(job) -> int:
+        written = job.metrics.bytes if job.metrics is not None else 0
+        return max(0, (job.disk_needed or 0) - written)
+
+
+def job_dirs(job) -> list[str]:
+    """Directories ``job`` writes to: its scratch root (if any) and its destination."""
+    scratch = job.settings.get("scratch_dir")
+    return [scratch, job.dest_dir] if scratch else [job.dest_dir]
@@ -0,0 +1,47 @@
+"""JobMetrics byte counts over a job's runs."""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bbdown_core import ProgressEvent  # noqa: E402
+from job_metrics import JobMetrics  # noqa: E402
+
+MIB = 1024 * 1024
+
+
+def transfer(part: int, done: float) -> ProgressEvent:
+    return ProgressEvent("video", part, 2, done, 10 * MIB)
+
+
+class BytesTest(unittest.TestCase):
+    def test_redraws_count_once(self):
+        metrics = JobMetrics()
+        metrics.start()
+        for done in (1, 4, 4, 10):
+            metrics.feed(transfer(1, done * MIB))
+        metrics.finish(0)
+        self.assertEqual(metrics.bytes, 10 * MIB)
+        self.assertEqual(metrics.attempts[0]["bytes"], 10 * MIB)
+
+    def test_resumed_part_counts_once(self):
+        metrics = JobMetrics()
+        metrics.start()
+        metrics.feed(transfer(1, 10 * MIB))
+        metrics.feed(transfer(2, 4 * MIB))
+        metrics.finish(1)
+
+        # aria2c --continue reports part 2 from what is already on disk
+        metrics.start()
+        for done in (4, 7, 10):
+            metrics.feed(transfer(2, done * MIB))
+        metrics.finish(0)
+
+        self.assertEqual(metrics.bytes, 20 * MIB)
+        self.assertEqual([a["bytes"] for a in metrics.attempts], [14 * MIB, 6 * MIB])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+"""ProgressParser against BBDown (with aria2c) and ffmpeg transcripts.
+
+Each fixtures/<name>.log is fed line by line, split the way open_output
+splits a process's output ("\\r" redraws are lines of their own), and
+every line's event is compared with fixtures/<name>.events.json: null
+for no event, else its stage, part, done / total, unit and ETA.
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bbdown_core import ProgressParser  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def read_lines(name: str) -> list[str]:
+    with open(os.path.join(FIXTURES, name + ".log"), "r", encoding="utf-8", newline="") as f:
+        return list(f)
+
+
+def read_events(name: str) -> list[dict | None]:
+    with open(os.path.join(FIXTURES, name + ".events.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class TranscriptTest(unittest.TestCase):
+    def check(self, name: str, parser: ProgressParser):
+        lines = read_lines(name)
+        expected = read_events(name)
+        self.assertEqual(len(lines), len(expected))
+        for number, (line, want) in enumerate(zip(lines, expected), 1):
+            with self.subTest(line=number, text=line.rstrip("\r\n")):
+                event = parser.feed(line)
+                if want is None:
+                    self.assertIsNone(event)
+                    continue
+                self.assertIsNotNone(event)
+                self.assertEqual(event.stage, want["stage"])
+                self.assertEqual((event.part, event.parts), (want["part"], want["parts"]))
+                self.assertEqual(event.unit, want["unit"])
+                self.assertAlmostEqual(event.done, want["done"], places=2)
+                self.assertAlmostEqual(event.total, want["total"], places=2)
+                if want["eta"] is None:
+                    self.assertIsNone(event.eta)
+                else:
+                    self.assertAlmostEqual(event.eta, want["eta"], places=2)
+
+    def test_bbdown_with_aria2c(self):
+        parser = ProgressParser()
+        self.check("bbdown_aria2c", parser)
+        self.assertEqual(parser.aid, "1155660001")
+        self.assertEqual(parser.pages_seen, [1, 2])
+
+    def test_ffmpeg(self):
+        parser = ProgressParser(stage="encode")
+        self.check("ffmpeg_mp3", parser)
+        self.assertAlmostEqual(parser.duration, 200.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""run_download against the stub BBDown: work folders, retries and the index.
+
+bench/stub_tool.py stands in for BBDown (see its docstring for the
+BENCH_* knobs). Each test runs in a temporary folder with its own
+output folder, download index and, where set, scratch folder.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "bench"))
+
+from bbdown_core import Job, ProgressParser, build_command, open_index, run_download, run_job_process, tool_paths  # noqa: E402
+from run_bench import bench_settings, make_stubs  # noqa: E402
+
+URL = "https://www.bilibili.com/video/BV1xx411c7mD"
+VIDEO_ID = "BV1xx411c7mD"
+
+
+def tree(path: str) -> list[str]:
+    """Files under ``path``, relative to it."""
+    files = []
+    for dirpath, _, names in os.walk(path):
+        files += [os.path.relpath(os.path.join(dirpath, name), path) for name in names]
+    return sorted(files)
+
+
+class RunDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="bbdown-test-")
+        self.addCleanup(shutil.rmtree, self.dir, True)
+        self.out = os.path.join(self.dir, "out")
+        os.makedirs(self.out)
+        self.addCleanup(os.chdir, os.getcwd())
+        # Job takes the current folder as its destination
+        os.chdir(self.out)
+
+        env = mock.patch.dict(os.environ, {"BENCH_LINES": "5", "BENCH_SIZE": "1024"})
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.settings = bench_settings(make_stubs(self.dir), self.dir, 1)
+        # "-p ALL", so the stub writes every page
+        self.settings.update(page_type=1, retry_attempts=2, retry_backoff=0.01)
+        self.index = open_index(self.settings)
+        self.addCleanup(self.index.close)
+
+    def stub(self, **values):
+        for name, value in values.items():
+            os.environ[f"BENCH_{name.upper()}"] = str(value)
+
+    def download(self) -> tuple[Job, list[int] | None]:
+        job = Job(1, URL, build_command(self.settings, URL, tool_paths(self.settings)), self.settings)
+
+        def run_once(job):
+            parser = ProgressParser()
+            run_job_process(job, parser=parser)
+            return parser
+
+        return job, run_download(job, run_once, index=self.index)
+
+    def indexed(self) -> dict[int, str]:
+        quality, mode = "", "video"
+        rows = self.index._db.execute(
+            "SELECT page, output_path FROM downloads WHERE video_id = ? AND quality = ? AND mode = ?",
+            (VIDEO_ID, quality, mode),
+        ).fetchall()
+        return {page: os.path.relpath(path, self.out) for page, path in rows}
+
+    def test_pages_are_published_and_indexed(self):
+        self.stub(pages=2)
+        job, failed = self.download()
+        self.assertEqual(failed, [])
+        self.assertEqual(tree(self.out), ["Benchmark Video/[P01]Part 1.mp4", "Benchmark Video/[P02]Part 2.mp4"])
+        self.assertEqual(self.indexed(), {1: "Benchmark Video/[P01]Part 1.mp4", 2: "Benchmark Video/[P02]Part 2.mp4"})
+        self.assertEqual(job.work_dir, job.dest_dir)
+
+    def test_numeric_title_is_not_taken_for_the_temp_folder(self):
+        # BBDown's temp folder is named after the aid; a title made of digits is not it
+        self.stub(pages=2, title="2077")
+        job, failed = self.download()
+        self.assertEqual(failed, [])
+        self.assertEqual(tree(self.out), ["2077/[P01]Part 1.mp4", "2077/[P02]Part 2.mp4"])
+        self.assertEqual(sorted(self.indexed()), [1, 2])
+
+    def test_retry_fetches_only_the_failed_pages(self):
+        self.stub(pages=3, fail="2")
+        self.settings["scratch_dir"] = os.path.join(self.dir, "scratch")
+        job, failed = self.download()
+        self.assertEqual(failed, [])
+        self.assertEqual(job.retries, 1)
+        self.assertEqual(job.cmd[job.cmd.index("--select-page") + 1], "2-3")
+        self.assertEqual(sorted(self.indexed()), [1, 2, 3])
+        self.assertEqual(len(tree(self.out)), 3)
+        # the job's folder on the scratch disk, with BBDown's temp folder, is gone
+        self.assertEqual(os.listdir(self.settings["scratch_dir"]), [])
+
+    def test_unrecovered_pages_are_not_indexed(self):
+        self.stub(pages=2, fail="2")
+        self.settings["retry_attempts"] = 0
+        job, failed = self.download()
+        self.assertEqual(failed, [2])
+        self.assertEqual(sorted(self.indexed()), [1])
+        self.assertEqual(tree(self.out), ["Benchmark Video/[P01]Part 1.mp4"])
+
+    def test_output_that_cannot_be_moved_is_kept(self):
+        # a folder where the finished file should go
+        os.makedirs(os.path.join(self.out, "Benchmark Video.mp4"))
+        job, failed = self.download()
+        self.assertEqual(failed, [1])
+        self.assertEqual(job.retries, 0)
+        self.assertEqual(self.indexed(), {})
+        kept = os.path.basename(job.work_dir)
+        self.assertTrue(kept.startswith("bbdown-kept-"), kept)
+        self.assertEqual(tree(job.work_dir), ["Benchmark Video.mp4"])
+        self.assertEqual(os.path.getsize(os.path.join(job.work_dir, "Benchmark Video.mp4")), 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
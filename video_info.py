@@ -0,0 +1,217 @@
+"""Video metadata preview through ``BBDown --only-show-info``.
+
+Results are cached on disk per video id for ``info_cache_ttl`` seconds,
+so the page chooser and priority editors can fill in without another
+BBDown launch.
+"""
+
+import io
+import json
+import re
+import subprocess
+import threading
+import time
+
+from bbdown_core import POPEN_FLAGS, data_path, open_output
+from download_index import video_id_from_url
+from staging import write_atomic
+
+INFO_CACHE_FILE = "info_cache.json"
+DEFAULT_INFO_TTL = 3600
+INFO_TIMEOUT = 60
+
+# P1: [123456] [page title] [03m20s]
+INFO_PAGE_RE = re.compile(r"^P(\d+):\s*\[(\d*)\]\s*\[(.*)\]\s*\[([^\]]*)\]")
+# 0. [1080P 高清] [1920x1080] [HEVC] [29.412] [1234 kbps] [~12.34 MB]
+INFO_VIDEO_RE = re.compile(r"^\d+\.\s*\[([^\]]+)\]\s*\[(\d+x\d+)\]\s*\[([^\]]+)\]")
+# 0. [M4A] [192 kbps] [~3.21 MB]
+INFO_AUDIO_RE = re.compile(r"^\d+\.\s*\[([^\]]+)\]\s*\[(\d+) kbps\]")
+DURATION_RE = re.compile(r"(\d+)([hms])")
+# the stream's estimated size for the first page, "[~12.34 MB]"
+INFO_SIZE_RE = re.compile(r"\[~([\d.]+)\s*([KMG]?B)\]")
+SIZE_UNITS = {"B": 1, "KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30}
+
+CODEC_NAMES = {"AVC": "avc", "HEVC": "hevc", "AV1": "av1"}
+
+
+def _duration_seconds(text: str) -> int:
+    return sum(int(n) * {"h": 3600, "m": 60, "s": 1}[u] for n, u in DURATION_RE.findall(text))
+
+
+def _stream_size(message: str) -> int:
+    m = INFO_SIZE_RE.search(message)
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2)]) if m else 0
+
+
+def parse_info(lines) -> dict:
+    """Pull title, pages, qualities, codecs and stream sizes out of BBDown's info output."""
+    info = {
+        "title": "", "pages": [], "qualities": [], "encodings": [], "audio": [],
+        "video_sizes": [], "audio_sizes": [],
+    }
+
+    for line in lines:
+        message = line.split("] - ", 1)[-1].strip()
+
+        if message.startswith("视频标题:"):
+            info["title"] = message.split(":", 1)[1].strip()
+            continue
+
+        m = INFO_PAGE_RE.match(message)
+        if m:
+            page, cid, title, duration = m.groups()
+            info["pages"].append({
+                "page": int(page),
+                "cid": cid,
+                "title": title,
+                "duration": _duration_seconds(duration),
+            })
+            continue
+
+        m = INFO_VIDEO_RE.match(message)
+        if m:
+            quality, _, codec = m.groups()
+            if quality not in info["qualities"]:
+                info["qualities"].append(quality)
+            codec = CODEC_NAMES.get(codec.upper(), codec.lower())
+            if codec not in info["encodings"]:
+                info["encodings"].append(codec)
+            info["video_sizes"].append(_stream_size(message))
+            continue
+
+        m = INFO_AUDIO_RE.match(message)
+        if m:
+            info["audio"].append(f"{m.group(1)} {m.group(2)} kbps")
+            info["audio_sizes"].append(_stream_size(message))
+
+    return info
+
+
+def estimate_size(info: dict, pages: list[int] | None = None, audio_only: bool = False) -> int:
+    """Bytes a download of ``pages`` (all when None) needs on disk at its peak.
+
+    The listed stream sizes are for the first page; other pages are scaled
+    by duration. The largest streams are assumed, as BBDown's default pick.
+    A merged download briefly holds one page twice, as tracks and as the
+    muxed file, so that page is counted again.
+    """
+    per_page = max(info.get("audio_sizes") or [0])
+    if not audio_only:
+        per_page += max(info.get("video_sizes") or [0])
+    listed = info.get("pages") or []
+    if not per_page or not listed:
+        return 0
+
+    first = listed[0]["duration"] or 1
+    sizes = [
+        per_page * (p["duration"] or first) / first
+        for p in listed if pages is None or p["page"] in pages
+    ]
+    if not sizes:
+        return 0
+    return int(sum(sizes) + (0 if audio_only else max(sizes)))
+
+
+# ============================================================
+# Cache
+# ============================================================
+
+class InfoCache:
+    """Video id → parsed info, persisted as JSON and expired after ``ttl`` s."""
+
+    def __init__(self, path: str = "", ttl: float = DEFAULT_INFO_TTL):
+        self.path = path or data_path(INFO_CACHE_FILE)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict | None = None
+        # video ids being fetched right now → Event set when done
+        self._inflight: dict[str, threading.Event] = {}
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self):
+        try:
+            write_atomic(self.path, json.dumps(self._entries, ensure_ascii=False))
+        except OSError as e:
+            print("Failed to save info cache:", e)
+
+    def get(self, url: str) -> dict | None:
+        with self._lock:
+            entry = self._load().get(video_id_from_url(url))
+        if entry and time.time() - entry["fetched_at"] < self.ttl:
+            return entry["info"]
+        return None
+
+    def put(self, url: str, info: dict):
+        with self._lock:
+            entries = self._load()
+            now = time.time()
+            for vid in [v for v, e in entries.items() if now - e["fetched_at"] >= self.ttl]:
+                del entries[vid]
+            entries[video_id_from_url(url)] = {"fetched_at": now, "info": info}
+            self._save()
+
+    def fetch(self, url: str, bbdown_path: str) -> dict:
+        """Cached info for ``url``, running BBDown only on a miss.
+
+        Concurrent fetches of the same video share one BBDown run.
+        """
+        info = self.get(url)
+        if info is not None:
+            return info
+
+        vid = video_id_from_url(url)
+        with self._lock:
+            event = self._inflight.get(vid)
+            owner = event is None
+            if owner:
+                event = self._inflight[vid] = threading.Event()
+
+        if not owner:
+            event.wait(INFO_TIMEOUT)
+            info = self.get(url)
+            if info is None:
+                raise RuntimeError("Fetching video info failed.")
+            return info
+
+        try:
+            info = run_info(url, bbdown_path)
+            self.put(url, info)
+            return info
+        finally:
+            with self._lock:
+                del self._inflight[vid]
+            event.set()
+
+
+def run_info(url: str, bbdown_path: str) -> dict:
+    process = subprocess.Popen(
+        [bbdown_path, "--only-show-info", "--show-all", url.split("?")[0]],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        creationflags=POPEN_FLAGS,
+    )
+    # reading the pipe to EOF would wait out a hung BBDown; this bounds it
+    try:
+        out, _ = process.communicate(timeout=INFO_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        # not communicate(): a grandchild may still hold the pipe open
+        process.wait()
+        process.stdout.close()
+        raise RuntimeError(f"BBDown gave no video info within {INFO_TIMEOUT}s.")
+    lines = list(open_output(io.BytesIO(out)))
+    if process.returncode != 0:
+        raise RuntimeError(f"BBDown exited with code {process.returncode}:\n{''.join(lines[-5:])}")
+
+    info = parse_info(lines)
+    if not info["pages"] and not info["title"]:
+        raise RuntimeError("No video info found in BBDown output.")
+    return info
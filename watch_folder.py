@@ -0,0 +1,138 @@
+"""Watch-folder mode: hand finished .m4a downloads to the converter.
+
+The folder is polled rather than hooked into OS notifications, so it
+works the same on every platform and on network mounts. A file counts
+as finished once its size and mtime have stayed put for ``settle``
+seconds and no aria2c control file sits next to it.
+"""
+
+import json
+import os
+import threading
+import time
+
+from staging import JOB_DIR_PREFIX, write_atomic
+
+DEFAULT_WATCH_INTERVAL = 2.0
+DEFAULT_WATCH_SETTLE = 3.0
+
+
+def _is_bbdown_temp_dir(dirpath: str) -> bool:
+    # BBDown writes into the job's work folder (its temp folder is inside);
+    # finished files are moved out of it
+    return os.path.basename(dirpath).startswith(JOB_DIR_PREFIX)
+
+
+class FolderWatcher:
+    """Polls ``directory`` and calls ``on_ready(path)`` once per new file.
+
+    Handled files are remembered in ``state_path`` (by size and mtime), and
+    files older than the previous session's last scan are ignored, so a
+    restart does not reconvert what is already there.
+    """
+
+    def __init__(self, directory: str, on_ready, state_path: str,
+                 interval: float = DEFAULT_WATCH_INTERVAL, settle: float = DEFAULT_WATCH_SETTLE,
+                 ext: str = ".m4a"):
+        self.directory = directory
+        self.on_ready = on_ready
+        self.state_path = state_path
+        self.interval = interval
+        self.settle = settle
+        self.ext = ext
+
+        # path → (size, mtime, first time seen with that size/mtime)
+        self._candidates: dict[str, tuple[int, float, float]] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+        state = self._load_state()
+        self._handled: dict[str, list] = state.get("handled", {})
+        self._since = state.get("last_scan") or time.time()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(self.interval * 2)
+            self._thread = None
+        self._save_state()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.scan_once()
+            except Exception as e:
+                print("Watch folder scan failed:", e)
+            self._stop.wait(self.interval)
+
+    def scan_once(self, now: float | None = None) -> list[str]:
+        """One poll; returns the files handed to ``on_ready``."""
+        now = now or time.time()
+        seen = set()
+        ready = []
+
+        for dirpath, dirnames, names in os.walk(self.directory):
+            dirnames[:] = [d for d in dirnames if not _is_bbdown_temp_dir(os.path.join(dirpath, d))]
+            for name in names:
+                if not name.lower().endswith(self.ext):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                seen.add(path)
+
+                if st.st_mtime < self._since - 1:
+                    continue
+                if self._handled.get(path) == [st.st_size, st.st_mtime]:
+                    continue
+                if os.path.exists(path + ".aria2"):
+                    continue
+
+                previous = self._candidates.get(path)
+                if previous is None or previous[:2] != (st.st_size, st.st_mtime):
+                    self._candidates[path] = (st.st_size, st.st_mtime, now)
+                    continue
+                if st.st_size and now - previous[2] >= self.settle:
+                    del self._candidates[path]
+                    self._handled[path] = [st.st_size, st.st_mtime]
+                    ready.append(path)
+
+        # forget files that are gone (converted sources are deleted)
+        for path in [p for p in self._handled if p not in seen]:
+            del self._handled[path]
+        for path in [p for p in self._candidates if p not in seen]:
+            del self._candidates[path]
+
+        if ready:
+            self._save_state()
+        for path in ready:
+            self.on_ready(path)
+        return ready
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        try:
+            write_atomic(self.state_path, json.dumps(
+                {"last_scan": time.time(), "handled": self._handled}, ensure_ascii=False,
+            ))
+        except OSError as e:
+            print("Failed to save watch state:", e)